@@ -98,10 +98,16 @@ async def run_ai(
     api_key: str,
     model: str,
     user_text: str,
-    tool_impl: dict[str, Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]],
+    tool_impl: dict[str, Callable[[Any, dict[str, Any]], Awaitable[dict[str, Any]]]],
+    tool_ctx: Any = None,
     history: list[dict[str, str]] | None = None,
 ) -> dict[str, Any]:
-    """Возвращает dict: {"text": str}"""
+    """
+    Возвращает dict: {"text": str}
+
+    tool_ctx передаётся первым аргументом в каждый инструмент из tool_impl,
+    поэтому сами инструменты можно объявить один раз на уровне модуля.
+    """
     client = AsyncOpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT)
     tools = build_tools()
 
@@ -154,7 +160,7 @@ async def run_ai(
                     args = {}
 
                 if name in tool_impl:
-                    result = await tool_impl[name](args)
+                    result = await tool_impl[name](tool_ctx, args)
                 else:
                     result = {"error": f"Unknown tool: {name}"}
 
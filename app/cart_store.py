@@ -15,6 +15,7 @@ from .storage import (
     cleanup_old_checkout_sessions,
     clear_cart,
     clear_chat_history,
+    close_db,
     compute_cart_hash,
     compute_stage,
     format_messages_for_ai,
@@ -28,6 +29,7 @@ from .storage import (
     get_user_events,
     get_user_messages,
     get_user_messages_count,
+    get_user_order_totals,
     get_user_orders_count,
     get_user_stage,
     has_user_consent,
@@ -44,6 +46,7 @@ __all__ = [
     # Database
     "DB_PATH",
     "init_db",
+    "close_db",
     # Cart
     "add_to_cart",
     "set_qty",
@@ -69,6 +72,7 @@ __all__ = [
     "get_user_events",
     "get_user_stage",
     "get_user_orders_count",
+    "get_user_order_totals",
     "get_daily_stats",
     "get_first_seen",
     "get_last_seen",
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import dataclass
+from typing import Any
 
 from aiogram import Dispatcher, F
 from aiogram.types import CallbackQuery, Message
@@ -16,6 +18,81 @@ from ..services import CartService, ProductService
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True, frozen=True)
+class ToolContext:
+    """Per-message state handed to AI tool implementations."""
+
+    user_id: int
+    product_service: ProductService
+    cart_service: CartService
+
+
+# ---------------------------------------------------------------------------
+# Tool implementations (module-level, shared across messages)
+# ---------------------------------------------------------------------------
+
+
+async def tool_search(ctx: ToolContext, args: dict[str, Any]) -> dict[str, Any]:
+    q = str(args.get("query", "")).strip().lower()
+    found = ctx.product_service.search(q)
+    return {
+        "results": [{k: p[k] for k in ("sku", "name", "price_rub", "stock")} for p in found[:10]]
+    }
+
+
+async def tool_add(ctx: ToolContext, args: dict[str, Any]) -> dict[str, Any]:
+    sku = str(args.get("sku", "")).strip()
+    qty = int(args.get("qty", 1))
+    logger.debug("Adding to cart: user_id=%s, sku=%s, qty=%s", ctx.user_id, sku, qty)
+
+    success, message = await ctx.cart_service.add_to_cart(ctx.user_id, sku, qty)
+    logger.debug("add_to_cart result: success=%s, message=%s", success, message)
+
+    if success:
+        return {"ok": True, "added": {"sku": sku, "qty": qty}}
+    else:
+        return {"ok": False, "error": message}
+
+
+async def tool_cart(ctx: ToolContext, args: dict[str, Any]) -> dict[str, Any]:
+    summary = await ctx.cart_service.get_cart_summary(ctx.user_id)
+    return {
+        "lines": summary.lines,
+        "total": summary.total,
+        "items_count": len(summary.items),
+    }
+
+
+async def tool_checkout_hint(ctx: ToolContext, args: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "hint": "Нажмите «Корзина» → «Оформить». Понадобится телефон и строка доставки (город/ПВЗ)."
+    }
+
+
+async def tool_list_all(ctx: ToolContext, args: dict[str, Any]) -> dict[str, Any]:
+    products = ctx.product_service.get_available_products()
+    result = [
+        {
+            "sku": p["sku"],
+            "name": p["name"],
+            "price_rub": p["price_rub"],
+            "stock": p["stock"],
+            "tags": p.get("tags", ""),
+        }
+        for p in products
+    ]
+    return {"products": result, "total_count": len(result)}
+
+
+TOOL_IMPL = {
+    "search_products": tool_search,
+    "add_to_cart": tool_add,
+    "show_cart": tool_cart,
+    "checkout_hint": tool_checkout_hint,
+    "list_all_products": tool_list_all,
+}
+
+
 def register_ai_handlers(
     dp: Dispatcher,
     product_service: ProductService,
@@ -45,82 +122,18 @@ def register_ai_handlers(
 
     @dp.message()
     async def any_text(m: Message):
-        logger.debug(f"any_text called, text={m.text}")
-
         # Check if user is in AI mode
         ai_mode = await cart_store.get_ai_mode(m.from_user.id)
-        logger.debug(f"ai_mode={ai_mode}")
         if not ai_mode:
             return
 
         cfg = Settings()
-        logger.debug(f"openai_api_key exists: {bool(cfg.openai_api_key)}")
         if not cfg.openai_api_key:
             await m.answer(
                 "ИИ-режим отключен: не задан OPENAI_API_KEY. Можно пользоваться каталогом кнопками."
             )
             return
 
-        logger.debug("Calling run_ai...")
-
-        # Tool implementations
-        async def tool_search(args):
-            q = str(args.get("query", "")).strip().lower()
-            found = product_service.search(q)
-            return {
-                "results": [
-                    {k: p[k] for k in ("sku", "name", "price_rub", "stock")} for p in found[:10]
-                ]
-            }
-
-        async def tool_add(args):
-            sku = str(args.get("sku", "")).strip()
-            qty = int(args.get("qty", 1))
-            logger.debug(f"Adding to cart: user_id={m.from_user.id}, sku={sku}, qty={qty}")
-
-            success, message = await cart_service.add_to_cart(m.from_user.id, sku, qty)
-            logger.debug(f"add_to_cart result: success={success}, message={message}")
-
-            if success:
-                return {"ok": True, "added": {"sku": sku, "qty": qty}}
-            else:
-                return {"ok": False, "error": message}
-
-        async def tool_cart(args):
-            summary = await cart_service.get_cart_summary(m.from_user.id)
-            return {
-                "lines": summary.lines,
-                "total": summary.total,
-                "items_count": len(summary.items),
-            }
-
-        async def tool_checkout_hint(args):
-            return {
-                "hint": "Нажмите «Корзина» → «Оформить». Понадобится телефон и строка доставки (город/ПВЗ)."
-            }
-
-        async def tool_list_all(args):
-            products = product_service.get_available_products()
-            result = [
-                {
-                    "sku": p["sku"],
-                    "name": p["name"],
-                    "price_rub": p["price_rub"],
-                    "stock": p["stock"],
-                    "tags": p.get("tags", ""),
-                }
-                for p in products
-            ]
-            return {"products": result, "total_count": len(result)}
-
-        tool_impl = {
-            "search_products": tool_search,
-            "add_to_cart": tool_add,
-            "show_cart": tool_cart,
-            "checkout_hint": tool_checkout_hint,
-            "list_all_products": tool_list_all,
-        }
-
         # Get chat history
         history = await cart_store.get_chat_history(m.from_user.id)
 
@@ -143,7 +156,8 @@ def register_ai_handlers(
             api_key=cfg.openai_api_key,
             model=cfg.openai_model,
             user_text=m.text or "",
-            tool_impl=tool_impl,
+            tool_impl=TOOL_IMPL,
+            tool_ctx=ToolContext(m.from_user.id, product_service, cart_service),
             history=history,
         )
 
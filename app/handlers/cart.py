@@ -48,11 +48,8 @@ def register_cart_handlers(
         state: FSMContext,
     ) -> None:
         """Create invoice, write order to sheets, send PDF, clear cart and state."""
-        # Parallel fetch: cart items and total calculation
-        cart_items, (_, total, _) = await asyncio.gather(
-            cart_store.get_cart(user_id),
-            cart_service.calc_cart_for_checkout(user_id),
-        )
+        # One cart read for items and total; lines are not needed here
+        total, _, cart_items = await cart_service.get_cart_totals(user_id)
 
         if not cart_items:
             await message.answer("Корзина пуста. Начните сначала.")
@@ -64,7 +61,7 @@ def register_cart_handlers(
         # Idempotent checkout: get or create session to avoid duplicate orders
         order_id, _ = await cart_store.get_or_create_checkout_session(
             user_id,
-            cart_items,
+            cart_items.items(),
             lambda: make_order_id("ORD"),
         )
         invoice_no = order_id
@@ -74,7 +71,7 @@ def register_cart_handlers(
 
         items_for_pdf: list[tuple[str, str, int, int]] = []
         spisanie_rows: list[list] = []
-        for sku, qty in cart_items:
+        for sku, qty in cart_items.items():
             p = products_by_sku.get(sku)
             if not p:
                 continue
@@ -93,7 +90,9 @@ def register_cart_handlers(
             )
 
         out_pdf = f"/app/data/invoices/{invoice_no}.pdf"
-        generate_invoice_pdf(
+        # PDF rendering is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(
+            generate_invoice_pdf,
             out_pdf,
             invoice_no=invoice_no,
             invoice_date=invoice_date,
@@ -113,7 +112,7 @@ def register_cart_handlers(
             total,
             "СДЭК",
             delivery,
-            "; ".join([f"{sku}:{qty}" for sku, qty in cart_items]),
+            "; ".join([f"{sku}:{qty}" for sku, qty in cart_items.items()]),
             f"{invoice_no}.pdf",
         ]
 
@@ -123,11 +122,14 @@ def register_cart_handlers(
             # optional spisanie (async with retry)
             cfg = Settings()
             if cfg.auto_write_spisanie:
+                # Sequential on purpose: stock is only decreased once the
+                # write-off is logged, so the two sheets never disagree
                 await retry_async(sheets_client.append_spisanie_rows, spisanie_rows)
-                # Update stock in Склад sheet (now async with batch update)
-                await retry_async(sheets_client.decrease_stock, [(sku, qty) for sku, qty in cart_items])
-                # Invalidate cache after stock update
-                product_service.invalidate_cache()
+                await retry_async(
+                    sheets_client.decrease_stock, list(cart_items.items())
+                )
+                # Stock changed: refetch products on next read, keep settings cached
+                product_service.invalidate_products()
 
             # Mark checkout session as completed
             await cart_store.mark_checkout_complete(user_id, order_id)
@@ -140,16 +142,10 @@ def register_cart_handlers(
                 'delivery': delivery,
             })
 
-            # CRM: Update lead stage to customer or repeat
-            orders_count = await cart_store.get_user_orders_count(user_id)
+            # CRM: Update lead stage to customer or repeat, with lifetime value
+            orders_count, lifetime_value = await cart_store.get_user_order_totals(user_id)
             stage = 'repeat' if orders_count >= 2 else 'customer'
 
-            # Calculate lifetime value
-            events = await cart_store.get_user_events(user_id, event_types=['order_created'])
-            lifetime_value = sum(
-                (e.get('payload') or {}).get('total', 0) for e in events
-            )
-
             try:
                 await sheets_client.upsert_lead(
                     user_id,
@@ -228,10 +224,12 @@ def register_cart_handlers(
     @dp.callback_query(F.data.startswith("cart:inc:"))
     async def cart_inc(cb: CallbackQuery):
         sku = cb.data.split(":")[2]
-        success, _ = await cart_service.add_to_cart(cb.from_user.id, sku, 1)
+        # One catalog lookup shared by the add check and the re-render
+        cart_products = product_service.get_cart_products()
+        success, _ = await cart_service.add_to_cart(cb.from_user.id, sku, 1, cart_products)
         if success:
             # Refresh cart display
-            summary = await cart_service.get_cart_summary(cb.from_user.id)
+            summary = await cart_service.get_cart_summary(cb.from_user.id, cart_products)
             text = cart_service.format_cart_text(summary)
             kb = cart_service.get_cart_keyboard(summary)
             try:
@@ -244,7 +242,7 @@ def register_cart_handlers(
     async def cart_dec(cb: CallbackQuery):
         sku = cb.data.split(":")[2]
         cart_items = await cart_store.get_cart(cb.from_user.id)
-        current_qty = next((qty for s, qty in cart_items if s == sku), 0)
+        current_qty = cart_items.get(sku, 0)
         if current_qty > 1:
             await cart_store.add_to_cart(cb.from_user.id, sku, -1)
         else:
@@ -291,19 +289,16 @@ def register_cart_handlers(
 
     @dp.callback_query(F.data == "checkout:start")
     async def checkout_start(cb: CallbackQuery, state: FSMContext):
-        # Parallel fetch: cart items and summary for min check
-        cart_items, summary = await asyncio.gather(
-            cart_store.get_cart(cb.from_user.id),
-            cart_service.get_cart_summary(cb.from_user.id),
-        )
+        # Min check only needs the total, skip rendering cart lines
+        total, min_sum, cart_items = await cart_service.get_cart_totals(cb.from_user.id)
 
         if not cart_items:
             await cb.answer("Корзина пустая")
             return
 
         # min check
-        if summary.below_min:
-            await cb.answer(f"Минималка {summary.min_sum} ₽")
+        if total < min_sum:
+            await cb.answer(f"Минималка {min_sum} ₽")
             return
 
         await state.set_state(CheckoutState.phone)
@@ -7,7 +7,13 @@ import logging
 from aiogram import Dispatcher, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.types import (
+    CallbackQuery,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    Message,
+)
 
 from .. import cart_store
 from ..keyboards import back_to_menu_kb, categories_kb, main_menu_kb, product_kb
@@ -160,6 +166,18 @@ def register_catalog_handlers(
         photo_url = product.get("photo_url", "")
 
         # Try to send/edit with photo
+        if photo_url and cb.message.photo:
+            # photo → photo: swap media in place (one API call instead of delete + send)
+            try:
+                await cb.message.edit_media(
+                    InputMediaPhoto(media=photo_url, caption=caption, parse_mode="HTML"),
+                    reply_markup=kb,
+                )
+                await cb.answer()
+                return
+            except Exception as e:
+                logger.debug("Cannot edit catalog media: %s", e)
+
         if photo_url:
             try:
                 # Delete old message and send new photo
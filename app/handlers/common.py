@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Any
 
 from ..utils import escape_html
@@ -12,34 +13,49 @@ def format_product(p: dict[str, Any], compact: bool = False) -> str:
     Format product for display using HTML.
     compact=True for catalog list, False for detail.
     """
-    stock = p["stock"]
+    if compact:
+        return _format_compact(p["name"], p["sku"], p["price_rub"], p["stock"])
+    return _format_full(
+        p["name"],
+        p["sku"],
+        p["price_rub"],
+        p["stock"],
+        p.get("desc_short", ""),
+        p.get("tags", ""),
+    )
+
+
+# Rendering is keyed on the product fields themselves, so a catalog refresh
+# with changed price/stock/name simply produces a new cache key.
+@lru_cache(maxsize=1024)
+def _format_compact(name: str, sku: str, price_rub: int, stock: int) -> str:
     stock_emoji = "✅" if stock > 5 else ("⚠️" if stock > 0 else "❌")
-    name = escape_html(p["name"])
-    sku = escape_html(p["sku"])
+    return (
+        f"🏷 <b>{escape_html(name)}</b>\n"
+        f"💰 {price_rub:,} ₽ • {stock_emoji} {stock} шт.\n"
+        f"📦 <code>{escape_html(sku)}</code>"
+    )
 
-    if compact:
-        return (
-            f"🏷 <b>{name}</b>\n"
-            f"💰 {p['price_rub']:,} ₽ • {stock_emoji} {stock} шт.\n"
-            f"📦 <code>{sku}</code>"
-        )
-    else:
-        desc = escape_html(p.get("desc_short", ""))
-        tags = escape_html(p.get("tags", ""))
-        lines = [
-            "━━━━━━━━━━━━━━━━━━━━━━",
-            f"🏷 <b>{name}</b>",
-            "",
-            f"💰 <b>Цена:</b> {p['price_rub']:,} ₽",
-            f"{stock_emoji} <b>В наличии:</b> {stock} шт.",
-            f"📦 <b>Артикул:</b> <code>{sku}</code>",
-        ]
-        if desc:
-            lines.append(f"\n📝 {desc}")
-        if tags:
-            lines.append(f"\n🔖 {tags}")
-        lines.append("━━━━━━━━━━━━━━━━━━━━━━")
-        return "\n".join(lines)
+
+@lru_cache(maxsize=1024)
+def _format_full(name: str, sku: str, price_rub: int, stock: int, desc: str, tags: str) -> str:
+    stock_emoji = "✅" if stock > 5 else ("⚠️" if stock > 0 else "❌")
+    desc = escape_html(desc)
+    tags = escape_html(tags)
+    lines = [
+        "━━━━━━━━━━━━━━━━━━━━━━",
+        f"🏷 <b>{escape_html(name)}</b>",
+        "",
+        f"💰 <b>Цена:</b> {price_rub:,} ₽",
+        f"{stock_emoji} <b>В наличии:</b> {stock} шт.",
+        f"📦 <b>Артикул:</b> <code>{escape_html(sku)}</code>",
+    ]
+    if desc:
+        lines.append(f"\n📝 {desc}")
+    if tags:
+        lines.append(f"\n🔖 {tags}")
+    lines.append("━━━━━━━━━━━━━━━━━━━━━━")
+    return "\n".join(lines)
 
 
 def format_product_card(product: dict[str, Any]) -> str:
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, BinaryIO
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
@@ -24,7 +24,7 @@ def rub(n: int) -> str:
 
 
 def generate_invoice_pdf(
-    out_path: str,
+    out_path: str | BinaryIO,
     *,
     invoice_no: str,
     invoice_date: str,
@@ -33,8 +33,13 @@ def generate_invoice_pdf(
     delivery: str,
     items: list[tuple[str, str, int, int]],  # sku, name, qty, price
 ) -> None:
+    """
+    Render invoice into out_path (file path or writable binary file object).
+    Blocking: handlers should call it via asyncio.to_thread.
+    """
     font = ensure_font()
-    c = Canvas(out_path, pagesize=A4)
+    # Compressed page streams keep the in-memory document small for long invoices
+    c = Canvas(out_path, pagesize=A4, pageCompression=1)
     w, h = A4
 
     y = h - 50
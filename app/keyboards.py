@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import Sequence
+
 from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -128,7 +130,7 @@ def cart_item_kb(sku: str, qty: int) -> list[InlineKeyboardButton]:
     ]
 
 
-def cart_with_items_kb(items: list[tuple]) -> InlineKeyboardMarkup:
+def cart_with_items_kb(items: Sequence[tuple]) -> InlineKeyboardMarkup:
     """Cart keyboard with +/- controls for each item. items = [(sku, qty, name), ...]"""
     rows = []
     for sku, qty, name in items:
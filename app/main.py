@@ -7,6 +7,7 @@ import logging
 import sys
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.types import ErrorEvent
 
 from . import cart_store
@@ -35,6 +36,28 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
 
 
+class KeepAliveSession(AiohttpSession):
+    """
+    AiohttpSession whose connector caches DNS and keeps idle TLS connections.
+
+    aiogram 3.6 has no public connector options: create_session() builds the
+    TCPConnector from the private ``_connector_init`` dict, so this is the one
+    place that extends it. Re-check on aiogram upgrades.
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._connector_init.update(ttl_dns_cache=300, keepalive_timeout=60)
+
+
+def create_bot_session() -> AiohttpSession:
+    """
+    Shared Bot API session for all handlers.
+    Keeps TLS connections alive between bursts of edits/answers and caches DNS.
+    """
+    return KeepAliveSession()
+
+
 async def global_error_handler(event: ErrorEvent) -> bool:
     """Global error handler for all unhandled exceptions."""
     logger.error(
@@ -71,7 +94,7 @@ async def main():
     logger.info("config_loaded", extra={"sheet_id_prefix": cfg.sheet_id()[:10]})
 
     # Initialize bot and dispatcher
-    bot = Bot(token=cfg.telegram_bot_token)
+    bot = Bot(token=cfg.telegram_bot_token, session=create_bot_session())
     dp = Dispatcher()
 
     # Ensure polling works even if webhook was previously set for this bot token
@@ -96,6 +119,13 @@ async def main():
     cart_service = CartService(product_service)
     logger.info("Services initialized")
 
+    # Prefetch catalog so the first user does not pay for cold Sheets reads
+    try:
+        await product_service.warm_up()
+        logger.info("Catalog cache warmed up")
+    except Exception as e:
+        logger.warning("Catalog warm-up failed, will load on first request: %s", e)
+
     # Initialize database
     await cart_store.init_db()
     logger.info("Database initialized")
@@ -110,7 +140,10 @@ async def main():
 
     # Start polling
     logger.info("Bot started, polling for updates...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await cart_store.close_db()
 
 
 if __name__ == "__main__":
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Product:
     sku: str
     name: str
@@ -18,7 +18,7 @@ class Product:
     tags: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OrderDraft:
     user_id: int
     phone: str
@@ -7,19 +7,18 @@ from dataclasses import dataclass
 
 from .. import cart_store
 from ..keyboards import cart_kb, cart_with_items_kb
-from ..utils import escape_html
-from .product_service import ProductService
+from .product_service import CartProduct, ProductService
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CartSummary:
     """Cart summary data."""
 
-    lines: list[str]
+    lines: tuple[str, ...]
     total: int
-    items: list[tuple[str, int, str]]  # (sku, qty, name)
+    items: tuple[tuple[str, int, str], ...]  # (sku, qty, name)
     is_empty: bool
     min_sum: int
     below_min: bool
@@ -31,35 +30,46 @@ class CartService:
     def __init__(self, product_service: ProductService):
         self._products = product_service
 
-    async def get_cart_summary(self, user_id: int) -> CartSummary:
-        """Get cart summary with formatted lines and total."""
+    async def get_cart_summary(
+        self,
+        user_id: int,
+        cart_products: dict[str, CartProduct] | None = None,
+        min_sum: int | None = None,
+    ) -> CartSummary:
+        """
+        Get cart summary with formatted lines and total.
+        cart_products/min_sum may be passed by callers that already fetched them.
+        """
         cart_items = await cart_store.get_cart(user_id)
-        products_by_sku = self._products.get_products_by_sku()
-        min_sum = self._products.get_min_order_sum()
+        if min_sum is None:
+            min_sum = self._products.get_min_order_sum()
 
+        # Empty cart: no need to touch the catalog
         if not cart_items:
             return CartSummary(
-                lines=[],
+                lines=(),
                 total=0,
-                items=[],
+                items=(),
                 is_empty=True,
                 min_sum=min_sum,
                 below_min=True,
             )
 
-        lines = []
-        total = 0
-        items = []
-
-        for sku, qty in cart_items:
-            p = products_by_sku.get(sku)
-            if not p:
-                continue
-            line_sum = qty * p["price_rub"]
-            total += line_sum
-            name = escape_html(p["name"])
-            lines.append(f"• <b>{name}</b>\n  {qty} × {p['price_rub']:,} ₽ = <b>{line_sum:,} ₽</b>")
-            items.append((sku, qty, p["name"]))
+        # Bind the lookup once instead of resolving .get per cart line
+        get_product = (cart_products or self._products.get_cart_products()).get
+
+        # Resolve products once; lines/items are derived from the same rows
+        rows = [
+            (sku, qty, p, qty * p.price_rub)
+            for sku, qty in cart_items.items()
+            if (p := get_product(sku))
+        ]
+        total = sum(r[3] for r in rows)
+        lines = tuple(
+            f"• <b>{p.name_html}</b>\n  {qty} × {p.price_fmt} ₽ = <b>{line_sum:,} ₽</b>"
+            for _, qty, p, line_sum in rows
+        )
+        items = tuple((sku, qty, p.name) for sku, qty, p, _ in rows)
 
         return CartSummary(
             lines=lines,
@@ -70,6 +80,28 @@ class CartService:
             below_min=total < min_sum,
         )
 
+    async def get_cart_totals(
+        self,
+        user_id: int,
+        cart_products: dict[str, CartProduct] | None = None,
+        min_sum: int | None = None,
+    ) -> tuple[int, int, dict[str, int]]:
+        """
+        Get cart total without rendering lines.
+        Returns (total, min_sum, cart_items) for callers that only check amounts.
+        """
+        cart_items = await cart_store.get_cart(user_id)
+        if min_sum is None:
+            min_sum = self._products.get_min_order_sum()
+        if not cart_items:
+            return 0, min_sum, cart_items
+
+        get_product = (cart_products or self._products.get_cart_products()).get
+        total = sum(
+            qty * p.price_rub for sku, qty in cart_items.items() if (p := get_product(sku))
+        )
+        return total, min_sum, cart_items
+
     def format_cart_text(self, summary: CartSummary) -> str:
         """Format cart for display using HTML."""
         if summary.is_empty:
@@ -94,54 +126,57 @@ class CartService:
         user_id: int,
         sku: str,
         qty: int,
+        cart_products: dict[str, CartProduct] | None = None,
     ) -> tuple[bool, str]:
         """
         Add item to cart with validation.
         Returns (success, message).
         """
-        product = self._products.get_product(sku)
+        product = (cart_products or self._products.get_cart_products()).get(sku)
 
         if not product:
             logger.warning("add_nonexistent_sku", extra={"sku": sku})
             return False, f"Товар с артикулом {sku} не найден"
 
-        if product["stock"] <= 0:
-            return False, f"Товар «{product['name']}» закончился на складе"
+        if product.stock <= 0:
+            return False, f"Товар «{product.name}» закончился на складе"
 
         # Check current cart qty + new qty doesn't exceed stock
-        cart_items = await cart_store.get_cart(user_id)
-        current_qty = next((q for s, q in cart_items if s == sku), 0)
+        qty_by_sku = await cart_store.get_cart(user_id)
+        current_qty = qty_by_sku.get(sku, 0)
 
-        if current_qty + qty > product["stock"]:
-            available = product["stock"] - current_qty
+        if current_qty + qty > product.stock:
+            available = product.stock - current_qty
             if available <= 0:
-                return False, f"Максимум {product['stock']} шт. уже в корзине"
-            return False, f"Можно добавить ещё {available} шт. (остаток: {product['stock']})"
+                return False, f"Максимум {product.stock} шт. уже в корзине"
+            return False, f"Можно добавить ещё {available} шт. (остаток: {product.stock})"
 
         await cart_store.add_to_cart(user_id, sku, qty)
 
-        # Get updated cart info
-        cart_items = await cart_store.get_cart(user_id)
-        total_items = sum(q for _, q in cart_items)
+        # Derive updated total locally instead of re-reading the cart
+        total_items = sum(qty_by_sku.values()) + qty
 
-        return True, f"✅ {product['name']} × {qty} добавлено!\n🧺 В корзине: {total_items} шт."
+        return True, f"✅ {product.name} × {qty} добавлено!\n🧺 В корзине: {total_items} шт."
 
     async def calc_cart_for_checkout(
         self,
         user_id: int,
-    ) -> tuple[list[str], int, list[tuple[str, int]]]:
+        cart_products: dict[str, CartProduct] | None = None,
+    ) -> tuple[list[str], int, dict[str, int]]:
         """Calculate cart for checkout. Returns (lines, total, items)."""
         cart_items = await cart_store.get_cart(user_id)
-        products_by_sku = self._products.get_products_by_sku()
+        if not cart_items:
+            return [], 0, cart_items
 
+        get_product = (cart_products or self._products.get_cart_products()).get
         lines = []
         total = 0
-        for sku, qty in cart_items:
-            p = products_by_sku.get(sku)
+        for sku, qty in cart_items.items():
+            p = get_product(sku)
             if not p:
                 continue
-            line_sum = qty * p["price_rub"]
+            line_sum = qty * p.price_rub
             total += line_sum
-            lines.append(f"- {p['name']} ({sku}) × {qty} = {line_sum} ₽")
+            lines.append(f"- {p.name} ({sku}) × {qty} = {line_sum} ₽")
 
         return lines, total, cart_items
@@ -2,16 +2,38 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import sys
 import time
-from typing import Any
+from bisect import bisect_right
+from collections.abc import Callable
+from functools import partial
+from typing import Any, NamedTuple
 
 from ..sheets import SheetsClient
+from ..utils import escape_html
 
 logger = logging.getLogger(__name__)
 
 CACHE_TTL_SECONDS = 60
 
+# Separates per-product haystacks inside the search blob; stripped from the data
+_SEARCH_SEP = "\x00"
+
+# Category comes from callback data, so bound the per-refresh filter memo
+MAX_CATEGORY_FILTERS = 64
+
+
+class CartProduct(NamedTuple):
+    """Immutable per-SKU view with the fields cart math and rendering read."""
+
+    name: str
+    price_rub: int
+    stock: int
+    name_html: str
+    price_fmt: str
+
 
 class ProductService:
     """Service for product operations with TTL caching."""
@@ -19,64 +41,219 @@ class ProductService:
     def __init__(self, sheets_client: SheetsClient):
         self._sheets = sheets_client
         self._products_cache: list[dict[str, Any]] = []
+        # Cache timestamps use time.monotonic(); 0 means never loaded or invalidated
         self._products_cache_time: float = 0
+        self._products_version: int = 0
+        self._by_sku_cache: dict[str, dict[str, Any]] = {}
+        self._cart_products: dict[str, CartProduct] = {}
+        self._search_blob: str = ""
+        self._search_starts: list[int] = []
+        self._available_cache: list[dict[str, Any]] = []
+        self._by_category: dict[str, list[dict[str, Any]]] = {}
+        self._category_filter_cache: dict[str, list[dict[str, Any]]] = {}
         self._settings_cache: dict[str, Any] = {}
         self._settings_cache_time: float = 0
+        self._min_order_sum: int | None = None
         self._categories_cache: list[str] = []
         self._categories_cache_time: float = 0
+        # Stale-while-revalidate bookkeeping: one in-flight refresh per cache,
+        # generation bumps discard background results superseded by a sync refresh.
+        # Refreshes bypass SheetsClient's own products TTL so CACHE_TTL_SECONDS
+        # is the only staleness bound.
+        self._refreshers: dict[str, tuple[Callable[[], Any], Callable[[Any], None]]] = {
+            "products": (partial(sheets_client.get_products, force_refresh=True), self._set_products),
+            "settings": (sheets_client.get_settings, self._set_settings),
+            "categories": (
+                partial(sheets_client.get_categories, force_refresh=True),
+                self._set_categories,
+            ),
+        }
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._generations: dict[str, int] = dict.fromkeys(self._refreshers, 0)
+
+    def _needs_sync_refresh(self, key: str, cached_at: float, force: bool) -> bool:
+        """
+        Decide how to refresh a cache entry.
+        Never loaded, invalidated or forced: fetch inline.
+        Expired: keep serving cached data and start one background refresh
+        (falls back to inline fetch when no event loop is running).
+        """
+        if force or not cached_at:
+            self._generations[key] += 1
+            return True
+        if time.monotonic() - cached_at <= CACHE_TTL_SECONDS:
+            return False
+        return not self._schedule_refresh(key)
+
+    def _schedule_refresh(self, key: str) -> bool:
+        """Start a background refresh unless one is running. False if no loop."""
+        task = self._refresh_tasks.get(key)
+        if task is not None and not task.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._refresh_tasks[key] = loop.create_task(
+            self._refresh_in_background(key, self._generations[key])
+        )
+        return True
+
+    async def _refresh_in_background(self, key: str, generation: int) -> None:
+        fetch, apply = self._refreshers[key]
+        logger.debug("Refreshing %s cache in background", key)
+        try:
+            data = await asyncio.to_thread(fetch)
+        except Exception as e:
+            logger.warning("cache_refresh_failed", extra={"cache": key, "error": str(e)})
+            return
+        if self._generations[key] == generation:
+            apply(data)
+
+    async def warm_up(self) -> None:
+        """
+        Load products, settings and categories before serving traffic.
+        The Sheets reads are independent, so they run concurrently off the loop.
+        """
+        keys = list(self._refreshers)
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._refreshers[key][0]) for key in keys)
+        )
+        for key, data in zip(keys, results, strict=True):
+            self._generations[key] += 1
+            self._refreshers[key][1](data)
 
     def get_products(self, force_refresh: bool = False) -> list[dict[str, Any]]:
         """Get products with caching."""
-        now = time.time()
-        if force_refresh or (now - self._products_cache_time > CACHE_TTL_SECONDS):
+        if self._needs_sync_refresh("products", self._products_cache_time, force_refresh):
             logger.debug("Refreshing products cache")
-            self._products_cache = self._sheets.get_products()
-            self._products_cache_time = now
+            self._set_products(self._sheets.get_products(force_refresh=True))
         return self._products_cache
 
+    def _set_products(self, products: list[dict[str, Any]]) -> None:
+        self._products_cache = products
+        self._products_cache_time = time.monotonic()
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self) -> None:
+        """Rebuild lookup structures derived from the products cache."""
+        products = self._products_cache
+        self._products_version += 1
+        for p in products:
+            # Interned SKUs make dict lookups and cart comparisons pointer checks
+            p["sku"] = sys.intern(p["sku"])
+        self._by_sku_cache = {p["sku"]: p for p in products}
+        # Cart lines are rendered with pre-escaped name and pre-formatted price
+        self._cart_products = {
+            p["sku"]: CartProduct(
+                p["name"],
+                p["price_rub"],
+                p["stock"],
+                escape_html(p["name"]),
+                f"{p['price_rub']:,}",
+            )
+            for p in products
+        }
+        self._available_cache = [p for p in products if p["stock"] > 0 and p["price_rub"] > 0]
+        # Keyed by every tag, but each entry holds all products whose tag string
+        # contains it, matching filter_by_category's substring semantics
+        # (e.g. "табак" also lists products tagged "табак трубочный")
+        tagged = [(p, p.get("tags", "").lower()) for p in self._available_cache]
+        tokens = {t.strip() for _, tags in tagged for t in tags.split(",")}
+        tokens.discard("")
+        self._by_category = {
+            token: [p for p, tags in tagged if token in tags] for token in tokens
+        }
+        self._category_filter_cache = {}
+        # One lowercased blob of all haystacks so search() is a single C-level scan;
+        # _search_starts[i] is the blob offset where product i begins
+        hays = [
+            (p["name"] + " " + p.get("tags", "") + " " + p.get("desc_short", "") + " " + p["sku"])
+            .lower()
+            .replace(_SEARCH_SEP, "")
+            for p in products
+        ]
+        starts = []
+        offset = 0
+        for hay in hays:
+            starts.append(offset)
+            offset += len(hay) + 1
+        self._search_blob = _SEARCH_SEP.join(hays)
+        self._search_starts = starts
+
+    @property
+    def products_version(self) -> int:
+        """Monotonic counter bumped on every products refresh (for derived caches)."""
+        return self._products_version
+
     def get_available_products(self, force_refresh: bool = False) -> list[dict[str, Any]]:
-        """Get only in-stock products with price > 0."""
-        products = self.get_products(force_refresh)
-        return [p for p in products if p["stock"] > 0 and p["price_rub"] > 0]
+        """Get only in-stock products with price > 0 (shared list, treat as read-only)."""
+        self.get_products(force_refresh)
+        return self._available_cache
 
     def get_products_by_sku(self, force_refresh: bool = False) -> dict[str, dict[str, Any]]:
-        """Get products as a dict keyed by SKU."""
-        return {p["sku"]: p for p in self.get_products(force_refresh)}
+        """
+        Get products as a dict keyed by SKU.
+        The index is rebuilt together with the products cache; treat it as read-only.
+        """
+        self.get_products(force_refresh)
+        return self._by_sku_cache
+
+    def get_cart_products(self, force_refresh: bool = False) -> dict[str, CartProduct]:
+        """Get immutable cart views keyed by SKU (rebuilt with the products cache)."""
+        self.get_products(force_refresh)
+        return self._cart_products
 
     def get_product(self, sku: str) -> dict[str, Any] | None:
         """Get single product by SKU."""
-        products_by_sku = self.get_products_by_sku()
-        return products_by_sku.get(sku)
+        return self.get_products_by_sku().get(sku)
 
     def get_settings(self, force_refresh: bool = False) -> dict[str, Any]:
         """Get settings with caching."""
-        now = time.time()
-        if force_refresh or (now - self._settings_cache_time > CACHE_TTL_SECONDS):
+        if self._needs_sync_refresh("settings", self._settings_cache_time, force_refresh):
             logger.debug("Refreshing settings cache")
-            self._settings_cache = self._sheets.get_settings()
-            self._settings_cache_time = now
+            self._set_settings(self._sheets.get_settings())
         return self._settings_cache
 
+    def _set_settings(self, settings: dict[str, Any]) -> None:
+        self._settings_cache = settings
+        self._settings_cache_time = time.monotonic()
+        self._min_order_sum = None
+
     def get_min_order_sum(self) -> int:
-        """Get minimum order sum from settings."""
+        """Get minimum order sum from settings (parsed once per settings refresh)."""
         settings = self.get_settings()
-        return int(float(settings.get("Мин. сумма заказа", 5000)))
+        if self._min_order_sum is None:
+            self._min_order_sum = int(float(settings.get("Мин. сумма заказа", 5000)))
+        return self._min_order_sum
 
     def get_categories(self, force_refresh: bool = False) -> list[str]:
         """Get categories with caching."""
-        now = time.time()
-        if force_refresh or (now - self._categories_cache_time > CACHE_TTL_SECONDS):
+        if self._needs_sync_refresh("categories", self._categories_cache_time, force_refresh):
             logger.debug("Refreshing categories cache")
-            self._categories_cache = self._sheets.get_categories()
-            self._categories_cache_time = now
+            self._set_categories(self._sheets.get_categories(force_refresh=True))
         return self._categories_cache
 
+    def _set_categories(self, categories: list[str]) -> None:
+        self._categories_cache = categories
+        self._categories_cache_time = time.monotonic()
+
     def filter_by_category(self, category: str) -> list[dict[str, Any]]:
-        """Filter available products by category tag."""
+        """Filter available products by category tag (indexed per products refresh)."""
         products = self.get_available_products()
         if category == "all":
             return products
-        return [p for p in products if category.lower() in p.get("tags", "").lower()]
+        indexed = self._by_category.get(category.lower())
+        if indexed is not None:
+            return indexed
+        # Not a tag: same substring match, computed on demand
+        cached = self._category_filter_cache.get(category)
+        if cached is None:
+            needle = category.lower()
+            cached = [p for p in products if needle in p.get("tags", "").lower()]
+            if len(self._category_filter_cache) < MAX_CATEGORY_FILTERS:
+                self._category_filter_cache[category] = cached
+        return cached
 
     def search(self, query: str) -> list[dict[str, Any]]:
         """Search products by name, tags, description, SKU."""
@@ -85,17 +262,35 @@ class ProductService:
             return []
 
         products = self.get_products()
+        if _SEARCH_SEP in query:
+            return []
+
+        blob = self._search_blob
+        starts = self._search_starts
         found = []
-        for p in products:
-            hay = (
-                p["name"] + " " + p.get("tags", "") + " " + p.get("desc_short", "") + " " + p["sku"]
-            ).lower()
-            if query in hay:
-                found.append(p)
+        pos = blob.find(query)
+        while pos != -1:
+            idx = bisect_right(starts, pos) - 1
+            found.append(products[idx])
+            # Continue from the next product: one hit per product is enough
+            if idx + 1 >= len(starts):
+                break
+            pos = blob.find(query, starts[idx + 1])
         return found
 
+    def invalidate_products(self) -> None:
+        """
+        Drop only the products cache, e.g. after our own stock write.
+        Settings and categories stay cached; external sheet edits are still
+        picked up by the TTL since the Sheets API has no cheap change token.
+        """
+        self._products_cache_time = 0
+        self._generations["products"] += 1
+
     def invalidate_cache(self) -> None:
         """Force cache invalidation."""
         self._products_cache_time = 0
         self._settings_cache_time = 0
         self._categories_cache_time = 0
+        for key in self._generations:
+            self._generations[key] += 1
@@ -3,9 +3,13 @@ from __future__ import annotations
 import asyncio
 import logging
 import pathlib
+import random
 import re
+import threading
+import time
 from collections.abc import Callable
 from datetime import datetime
+from itertools import groupby
 from typing import Any, TypeVar
 
 from google.oauth2.service_account import Credentials
@@ -26,19 +30,66 @@ STAGE_PRIORITY = {
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+# Parsed Склад rows are shared by get_products/get_categories for this long
+PRODUCTS_CACHE_TTL_SECONDS = 30
+
+# Leads rows + user_id index are reused between upsert_lead calls for this long
+LEADS_CACHE_TTL_SECONDS = 15
+
+# At most this many blocking Sheets calls run in worker threads at once;
+# bursts queue here instead of fanning out into 429s and retry backoff
+SHEETS_MAX_CONCURRENCY = 4
+
 T = TypeVar("T")
 
+_GDRIVE_FILE_RE = re.compile(r"drive\.google\.com/file/d/([a-zA-Z0-9_-]+)")
+_NON_DIGIT_RE = re.compile(r"\D")
+# First row number of an A1 range such as "Leads!A57:M57" or "'Leads'!$A$57"
+_A1_FIRST_ROW_RE = re.compile(r"!\$?[A-Z]+\$?(\d+)")
+
+
+def _idx_to_a1(idx: int) -> str:
+    """0-based column index -> A1 letters (0 -> A, 25 -> Z, 26 -> AA)."""
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+# A1 column letters for the first 256 columns
+_A1_COL = tuple(_idx_to_a1(i) for i in range(256))
+
+# search_leads stops scanning once this many leads matched
+LEADS_SEARCH_LIMIT = 20
+
+
+def _retry_after_seconds(e: HttpError) -> float | None:
+    """Seconds from a Retry-After header (delta form only), if the response has one."""
+    get = getattr(e.resp, "get", None)
+    value = get("retry-after") if callable(get) else None
+    if not isinstance(value, str | int | float):
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
 
 async def retry_async(
     fn: Callable[..., Any],
     *args: Any,
     retries: int = 3,
     delay: float = 1.0,
+    max_delay: float = 30.0,
     **kwargs: Any,
 ) -> Any:
     """
-    Retry an async function with exponential backoff.
+    Retry an async function with jittered exponential backoff.
     Useful for transient Google Sheets API errors (429, 500, 503).
+    Honors Retry-After on HTTP errors; full jitter keeps concurrent
+    callers from retrying in lockstep.
     """
     last_exc: Exception | None = None
     for attempt in range(retries):
@@ -46,22 +97,28 @@ async def retry_async(
             return await fn(*args, **kwargs)
         except HttpError as e:
             # Retry on rate limit or server errors
-            if e.resp.status in (429, 500, 503):
-                last_exc = e
-                wait = delay * (2**attempt)
-                logger.warning(
-                    "Sheets API error %s, retrying in %.1fs (attempt %d/%d)",
-                    e.resp.status,
-                    wait,
-                    attempt + 1,
-                    retries,
-                )
-                await asyncio.sleep(wait)
-            else:
+            if e.resp.status not in (429, 500, 503):
                 raise
+            last_exc = e
+            if attempt == retries - 1:
+                break
+            wait = _retry_after_seconds(e)
+            if wait is None:
+                wait = random.uniform(0, min(max_delay, delay * (2**attempt)))
+            wait = min(wait, max_delay)
+            logger.warning(
+                "Sheets API error %s, retrying in %.1fs (attempt %d/%d)",
+                e.resp.status,
+                wait,
+                attempt + 1,
+                retries,
+            )
+            await asyncio.sleep(wait)
         except Exception as e:
             last_exc = e
-            wait = delay * (2**attempt)
+            if attempt == retries - 1:
+                break
+            wait = random.uniform(0, min(max_delay, delay * (2**attempt)))
             logger.warning(
                 "Sheets error: %s, retrying in %.1fs (attempt %d/%d)",
                 e,
@@ -85,14 +142,14 @@ def convert_photo_url(url: str) -> str:
 
     url = url.strip()
 
-    # Google Drive: /file/d/{ID}/view → /uc?export=view&id={ID}
-    gdrive_match = re.search(r"drive\.google\.com/file/d/([a-zA-Z0-9_-]+)", url)
-    if gdrive_match:
-        file_id = gdrive_match.group(1)
-        return f"https://drive.google.com/uc?export=view&id={file_id}"
+    if "drive.google.com" in url:
+        # Google Drive: /file/d/{ID}/view → /uc?export=view&id={ID}
+        gdrive_match = _GDRIVE_FILE_RE.search(url)
+        if gdrive_match:
+            file_id = gdrive_match.group(1)
+            return f"https://drive.google.com/uc?export=view&id={file_id}"
 
-    # Google Drive already in correct format
-    if "drive.google.com/uc" in url:
+        # Google Drive already in correct format (or unsupported Drive link)
         return url
 
     # Dropbox: change dl=0 to dl=1
@@ -102,6 +159,21 @@ def convert_photo_url(url: str) -> str:
     return url
 
 
+_ACTIVE_VALUES = frozenset(("да", "yes", "1", "true"))
+
+
+def _cell_to_int(x: str, default: int) -> int:
+    """Parse a price/stock cell like '1 000 ₽' or '12,5'; default when unparsable."""
+    if x.isascii() and x.isdigit():
+        return int(x)
+    try:
+        # Handle non-breaking spaces (\xa0) and regular spaces
+        clean = x.replace("\xa0", "").replace(" ", "").replace("₽", "").replace(",", ".")
+        return int(float(clean))
+    except (ValueError, OverflowError):
+        return default
+
+
 class SheetsClient:
     """Google Sheets client with sync methods and async wrappers."""
 
@@ -110,6 +182,17 @@ class SheetsClient:
         cred_path = pathlib.Path(service_account_json_path)
         creds = Credentials.from_service_account_file(str(cred_path), scopes=SCOPES)
         self.service = build("sheets", "v4", credentials=creds, cache_discovery=False)
+        # (monotonic fetch start time, products, categories); the lock also makes
+        # concurrent to_thread callers share one fetch instead of racing the API
+        self._products_cache: tuple[float, list[dict[str, Any]], list[str]] | None = None
+        self._products_lock = threading.Lock()
+        # Bumped by invalidate_products_cache() so an in-flight fetch that
+        # started before the invalidation does not cache its result
+        self._products_generation = 0
+        # (monotonic fetch time, rows, user_id -> sheet row); patched in place on writes
+        self._leads_cache: tuple[float, list[list[Any]], dict[int, int]] | None = None
+        self._leads_lock = threading.Lock()
+        self._io_sem = asyncio.Semaphore(SHEETS_MAX_CONCURRENCY)
 
     # -------------------------------------------------------------------------
     # Low-level sync methods (blocking)
@@ -118,18 +201,20 @@ class SheetsClient:
         resp = (
             self.service.spreadsheets()
             .values()
-            .get(spreadsheetId=self.spreadsheet_id, range=a1)
+            # Only the cell grid; skip range/majorDimension echo
+            .get(spreadsheetId=self.spreadsheet_id, range=a1, fields="values")
             .execute()
         )
         return resp.get("values", [])
 
-    def _append_values_sync(self, a1: str, rows: list[list[Any]]) -> None:
-        self.service.spreadsheets().values().append(
+    def _append_values_sync(self, a1: str, rows: list[list[Any]]) -> dict[str, Any]:
+        return self.service.spreadsheets().values().append(
             spreadsheetId=self.spreadsheet_id,
             range=a1,
             valueInputOption="USER_ENTERED",
             insertDataOption="INSERT_ROWS",
             body={"values": rows},
+            fields="updates.updatedRange",
         ).execute()
 
     def _update_values_sync(self, a1: str, values: list[list[Any]]) -> None:
@@ -138,6 +223,7 @@ class SheetsClient:
             range=a1,
             valueInputOption="USER_ENTERED",
             body={"values": values},
+            fields="updatedRange",
         ).execute()
 
     def _batch_update_values_sync(self, data: list[dict[str, Any]]) -> None:
@@ -147,22 +233,30 @@ class SheetsClient:
         self.service.spreadsheets().values().batchUpdate(
             spreadsheetId=self.spreadsheet_id,
             body={"valueInputOption": "USER_ENTERED", "data": data},
+            # Response is unused; don't ship back the per-range summaries
+            fields="totalUpdatedCells",
         ).execute()
 
     # -------------------------------------------------------------------------
     # Async wrappers (run blocking IO in thread pool)
     # -------------------------------------------------------------------------
+    async def _to_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Run a blocking Sheets call in a worker thread, bounded by SHEETS_MAX_CONCURRENCY."""
+        async with self._io_sem:
+            return await asyncio.to_thread(func, *args)
+
     async def get_values(self, a1: str) -> list[list[Any]]:
-        return await asyncio.to_thread(self._get_values_sync, a1)
+        return await self._to_thread(self._get_values_sync, a1)
 
-    async def append_values(self, a1: str, rows: list[list[Any]]) -> None:
-        await asyncio.to_thread(self._append_values_sync, a1, rows)
+    async def append_values(self, a1: str, rows: list[list[Any]]) -> dict[str, Any]:
+        """Append rows; the response carries updates.updatedRange (where they landed)."""
+        return await self._to_thread(self._append_values_sync, a1, rows)
 
     async def update_values(self, a1: str, values: list[list[Any]]) -> None:
-        await asyncio.to_thread(self._update_values_sync, a1, values)
+        await self._to_thread(self._update_values_sync, a1, values)
 
     async def batch_update_values(self, data: list[dict[str, Any]]) -> None:
-        await asyncio.to_thread(self._batch_update_values_sync, data)
+        await self._to_thread(self._batch_update_values_sync, data)
 
     # Backwards-compatible sync aliases for non-async callers (services/caches)
     def get_values_sync(self, a1: str) -> list[list[Any]]:
@@ -204,7 +298,7 @@ class SheetsClient:
             return
 
         sku_to_subtract = {s: q for s, q in sku_qty_list}
-        batch_data: list[dict[str, Any]] = []
+        updates: list[tuple[int, int]] = []  # (sheet row, new Списано value)
 
         for row_idx, row in enumerate(rows[1:], start=2):
             if len(row) <= sku_col:
@@ -219,12 +313,24 @@ class SheetsClient:
                     current = int(float(str(row[spisano_col]).replace(" ", "").replace(",", ".")))
                 except Exception:
                     current = 0
-            new_value = current + sku_to_subtract[sku]
-            cell = f"Склад!{chr(65 + spisano_col)}{row_idx}"
-            batch_data.append({"range": cell, "values": [[new_value]]})
+            updates.append((row_idx, current + sku_to_subtract[sku]))
+
+        # Rows are visited in order; adjacent rows share (row - position) and
+        # are merged into one range entry
+        col = _A1_COL[spisano_col]
+        batch_data: list[dict[str, Any]] = []
+        for _, group in groupby(enumerate(updates), key=lambda t: t[1][0] - t[0]):
+            run = [u for _, u in group]
+            batch_data.append(
+                {
+                    "range": f"Склад!{col}{run[0][0]}:{col}{run[-1][0]}",
+                    "values": [[value] for _, value in run],
+                }
+            )
 
         if batch_data:
             await self.batch_update_values(batch_data)
+            self.invalidate_products_cache()
 
     def get_settings(self) -> dict[str, Any]:
         rows = self.get_values_sync("Настройки!A2:B200")
@@ -239,17 +345,55 @@ class SheetsClient:
             out[k] = v
         return out
 
-    def get_products(self) -> list[dict[str, Any]]:
+    def invalidate_products_cache(self) -> None:
+        """
+        Drop cached products so the next get_products() refetches Склад.
+        Plain attribute writes, so it never waits on a fetch holding the lock
+        in a worker thread.
+        """
+        self._products_generation += 1
+        self._products_cache = None
+
+    def get_products(self, force_refresh: bool = False) -> list[dict[str, Any]]:
         """
         Flexible product parser that works with different table structures.
         Required columns: SKU, Наименование, Цена (or Цена_руб)
         Optional: Описание_кратко, Остаток (or Стартовый_остаток or Остаток_расчет), Активен, Теги, Фото_URL
+        Results are cached for PRODUCTS_CACHE_TTL_SECONDS unless force_refresh
+        (callers with their own TTL, e.g. ProductService); API errors are not cached.
         """
-        try:
-            rows = self.get_values_sync("Склад!A1:M1000")
-        except Exception:
-            return []
+        return self._get_products_cached(force_refresh)[0]
+
+    def _get_products_cached(
+        self, force_refresh: bool = False
+    ) -> tuple[list[dict[str, Any]], list[str]]:
+        """Return (products, categories) from the cache, refetching Склад when stale."""
+        requested_at = time.monotonic()
+        with self._products_lock:
+            cached = self._products_cache
+            # Even a forced call reuses a fetch that started after it was made
+            if cached is not None and (
+                cached[0] >= requested_at
+                or (not force_refresh and requested_at - cached[0] < PRODUCTS_CACHE_TTL_SECONDS)
+            ):
+                return cached[1], cached[2]
+
+            generation = self._products_generation
+            started = time.monotonic()
+            try:
+                rows = self.get_values_sync("Склад!A1:M1000")
+            except Exception:
+                return [], []
+
+            products = self._parse_products(rows)
+            categories = self._collect_categories(products)
+            if generation == self._products_generation:
+                self._products_cache = (started, products, categories)
+            return products, categories
 
+    @staticmethod
+    def _parse_products(rows: list[list[Any]]) -> list[dict[str, Any]]:
+        """Parse Склад rows (header first) into product dicts."""
         if not rows:
             return []
 
@@ -277,47 +421,48 @@ class SheetsClient:
         if col_sku == -1 or col_name == -1:
             return []  # Minimal required columns
 
-        def to_int(x, default=0):
-            try:
-                # Handle non-breaking spaces (\xa0) and regular spaces
-                clean = (
-                    str(x).replace("\xa0", "").replace(" ", "").replace("₽", "").replace(",", ".")
-                )
-                return int(float(clean))
-            except Exception:
-                return default
-
-        def safe_get(row, idx, default=""):
-            if idx == -1 or idx >= len(row):
-                return default
-            return str(row[idx]).strip()
+        # Rows are normalized to `width` cells with an always-empty spare cell
+        # at the end; missing optional columns point at it so every cell is
+        # read by plain indexing
+        cols = (col_price, col_desc, col_desc_full, col_stock, col_active, col_tags, col_photo)
+        width = max(col_sku, col_name, *cols) + 2
+        spare = width - 1
+        col_price, col_desc, col_desc_full, col_stock, col_active, col_tags, col_photo = (
+            spare if c == -1 else c for c in cols
+        )
+        check_active = col_active != spare
+        pad = [""] * width
+        to_int = _cell_to_int
 
         products = []
+        append = products.append
         for r in data:
-            sku = safe_get(r, col_sku)
+            n = len(r)
+            # Pad short rows; cut unmatched trailing columns so r[spare] == ""
+            r = r + pad[n:] if n < width else r[:spare] + pad[:1]
+
+            sku = str(r[col_sku]).strip()
             if not sku:
                 continue
 
             # Check "Активен" column if exists, otherwise assume active
-            if col_active != -1:
-                active_val = safe_get(r, col_active).lower()
-                if active_val and active_val not in ("да", "yes", "1", "true", ""):
+            if check_active:
+                active_val = str(r[col_active]).strip().lower()
+                if active_val and active_val not in _ACTIVE_VALUES:
                     continue
 
-            # Get stock: try Остаток_расчет first, then Стартовый_остаток
-            stock = to_int(safe_get(r, col_stock), 100)  # Default 100 if no stock column
-
-            products.append(
+            append(
                 {
                     "sku": sku,
-                    "name": safe_get(r, col_name, "Без названия"),
-                    "desc_short": safe_get(r, col_desc),
-                    "desc_full": safe_get(r, col_desc_full),
-                    "price_rub": to_int(safe_get(r, col_price), 0),
-                    "stock": stock,
+                    "name": str(r[col_name]).strip() if col_name < n else "Без названия",
+                    "desc_short": str(r[col_desc]).strip(),
+                    "desc_full": str(r[col_desc_full]).strip(),
+                    "price_rub": to_int(str(r[col_price]).strip(), 0),
+                    # Default 100 if no stock column
+                    "stock": to_int(str(r[col_stock]).strip(), 100),
                     "supplier_id": "",
-                    "photo_url": convert_photo_url(safe_get(r, col_photo)),
-                    "tags": safe_get(r, col_tags),
+                    "photo_url": convert_photo_url(str(r[col_photo]).strip()),
+                    "tags": str(r[col_tags]).strip(),
                 }
             )
         return products
@@ -336,12 +481,16 @@ class SheetsClient:
     async def append_spisanie_rows(self, rows: list[list[Any]]) -> None:
         await self.append_values("Списание!A1", rows)
 
-    def get_categories(self) -> list[str]:
-        """Extract unique tags/categories from all products."""
-        products = self.get_products()
+    def get_categories(self, force_refresh: bool = False) -> list[str]:
+        """Extract unique tags/categories from all products (reuses the products cache)."""
+        return self._get_products_cached(force_refresh)[1]
+
+    @staticmethod
+    def _collect_categories(products: list[dict[str, Any]]) -> list[str]:
+        """Sorted unique tags across products, read from the tags column only."""
         tags_set = set()
         for p in products:
-            tags = p.get("tags", "")
+            tags = p["tags"]
             if tags:
                 for tag in tags.split(","):
                     tag = tag.strip()
@@ -363,34 +512,76 @@ class SheetsClient:
         'orders_count', 'lifetime_value', 'last_order_id', 'consent_at',
         'consent_version', 'phone', 'tags', 'notes'
     ]
+    # Read-only padding source: row + _EMPTY_LEAD_ROW[len(row):] is a full-width row
+    _EMPTY_LEAD_ROW = [''] * len(LEADS_COLUMNS)
 
     def _get_leads_data_sync(self) -> tuple[list[list[Any]], dict[int, int]]:
         """
         Get all leads data and build user_id -> row_index mapping.
-        Returns (rows, user_id_to_row_idx).
+        Returns (rows, user_id_to_row_idx), cached for LEADS_CACHE_TTL_SECONDS.
         """
-        try:
-            rows = self._get_values_sync("Leads!A2:M10000")
-        except HttpError as e:
-            if e.resp.status == 400:
-                # Sheet might not exist yet
-                logger.warning("Leads sheet not found or empty")
-                return [], {}
-            raise
+        with self._leads_lock:
+            cached = self._leads_cache
+            if cached is not None and time.monotonic() - cached[0] < LEADS_CACHE_TTL_SECONDS:
+                return cached[1], cached[2]
 
-        user_id_to_row = {}
-        for idx, row in enumerate(rows):
-            if row and len(row) > 0:
-                try:
-                    uid = int(row[0])
-                    user_id_to_row[uid] = idx + 2  # +2 because A2 is row 2
-                except (ValueError, TypeError):
-                    pass
-        return rows, user_id_to_row
+            try:
+                rows = self._get_values_sync("Leads!A2:M10000")
+            except HttpError as e:
+                if e.resp.status == 400:
+                    # Sheet might not exist yet
+                    logger.warning("Leads sheet not found or empty")
+                    return [], {}
+                raise
+
+            user_id_to_row = {}
+            for idx, row in enumerate(rows):
+                if row and len(row) > 0:
+                    try:
+                        uid = int(row[0])
+                        user_id_to_row[uid] = idx + 2  # +2 because A2 is row 2
+                    except (ValueError, TypeError):
+                        pass
+            self._leads_cache = (time.monotonic(), rows, user_id_to_row)
+            return rows, user_id_to_row
+
+    def invalidate_leads_cache(self) -> None:
+        """Drop cached Leads rows so the next read refetches the sheet."""
+        with self._leads_lock:
+            self._leads_cache = None
+
+    def _remember_new_lead(self, user_id: int, row: list[Any], append_resp: Any) -> None:
+        """
+        Record a just-appended lead in the cache so later upserts stay hot.
+        The sheet row comes from the append's updates.updatedRange; concurrent
+        appends may land in any order, so the row is never guessed.
+        """
+        updated_range = ''
+        if isinstance(append_resp, dict):
+            updated_range = append_resp.get('updates', {}).get('updatedRange', '')
+        match = _A1_FIRST_ROW_RE.search(updated_range) if isinstance(updated_range, str) else None
+        if match is None:
+            self.invalidate_leads_cache()
+            return
+
+        sheet_row = int(match.group(1))
+        with self._leads_lock:
+            if self._leads_cache is None:
+                return
+            _, rows, user_map = self._leads_cache
+            idx = sheet_row - 2  # rows[0] is sheet row 2
+            if idx < 0 or (idx < len(rows) and rows[idx]):
+                # The cached snapshot disagrees with the sheet; refetch next time
+                self._leads_cache = None
+                return
+            # Rows appended by other writers may not be cached yet: keep them blank
+            rows.extend([] for _ in range(idx + 1 - len(rows)))
+            rows[idx] = row
+            user_map[user_id] = sheet_row
 
     async def get_lead(self, user_id: int) -> dict[str, Any] | None:
         """Get a lead by user_id."""
-        rows, user_map = await asyncio.to_thread(self._get_leads_data_sync)
+        rows, user_map = await self._to_thread(self._get_leads_data_sync)
 
         if user_id not in user_map:
             return None
@@ -399,10 +590,7 @@ class SheetsClient:
         if row_idx < 0 or row_idx >= len(rows):
             return None
 
-        row = rows[row_idx]
-        lead = {}
-        for i, col_name in enumerate(self.LEADS_COLUMNS):
-            lead[col_name] = row[i] if i < len(row) else ''
+        lead = self._lead_from_row(rows[row_idx])
 
         # Convert numeric fields
         try:
@@ -433,7 +621,7 @@ class SheetsClient:
         Stage only goes UP (new -> engaged -> cart -> checkout -> customer -> repeat).
         Returns True if successful.
         """
-        rows, user_map = await asyncio.to_thread(self._get_leads_data_sync)
+        rows, user_map = await self._to_thread(self._get_leads_data_sync)
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
         if user_id in user_map:
@@ -441,48 +629,61 @@ class SheetsClient:
             row_idx = user_map[user_id]
             existing_row = rows[row_idx - 2] if (row_idx - 2) < len(rows) else []
 
-            # Pad row to full length
-            while len(existing_row) < len(self.LEADS_COLUMNS):
-                existing_row.append('')
+            # Pad row to full length in one step
+            existing_row.extend(self._EMPTY_LEAD_ROW[len(existing_row):])
 
-            # Get current values
-            current_stage = existing_row[4] if len(existing_row) > 4 else ''
+            # Only cells this call changes are written: the cached row may be up to
+            # LEADS_CACHE_TTL_SECONDS old, and rewriting the whole row would revert
+            # edits made in the sheet (or by the owner bot) in the meantime
+            changes: dict[int, str] = {3: now}  # D: last_seen_at
 
             # Compute new stage (only goes up)
             if stage:
-                current_priority = STAGE_PRIORITY.get(current_stage, 0)
-                new_priority = STAGE_PRIORITY.get(stage, 0)
-                if new_priority > current_priority:
-                    existing_row[4] = stage
-
-            # Update last_seen_at
-            existing_row[3] = now
+                rank = STAGE_PRIORITY.get
+                if rank(stage, 0) > rank(existing_row[4], 0):
+                    changes[4] = stage
 
             # Update other fields if provided
             if username is not None:
-                existing_row[1] = username
+                changes[1] = username
             if consent_at is not None:
                 consent_str = consent_at.strftime('%Y-%m-%d %H:%M:%S') if isinstance(consent_at, datetime) else consent_at
                 if not existing_row[8]:  # Don't overwrite existing consent
-                    existing_row[8] = consent_str
-                    existing_row[9] = 'v1'
+                    changes[8] = consent_str
+                    changes[9] = 'v1'
             if phone is not None and phone:
-                existing_row[10] = phone
+                changes[10] = phone
             if orders_count is not None:
-                existing_row[5] = str(orders_count)
+                changes[5] = str(orders_count)
             if lifetime_value is not None:
-                existing_row[6] = str(lifetime_value)
+                changes[6] = str(lifetime_value)
             if last_order_id is not None:
-                existing_row[7] = last_order_id
+                changes[7] = last_order_id
             if tags is not None:
-                existing_row[11] = tags
+                changes[11] = tags
             if notes is not None:
-                existing_row[12] = notes
+                changes[12] = notes
+
+            # One range per run of adjacent changed columns
+            batch_data: list[dict[str, Any]] = []
+            for _, group in groupby(enumerate(sorted(changes)), key=lambda t: t[1] - t[0]):
+                cols = [col for _, col in group]
+                batch_data.append(
+                    {
+                        "range": f"Leads!{_A1_COL[cols[0]]}{row_idx}:{_A1_COL[cols[-1]]}{row_idx}",
+                        "values": [[changes[col] for col in cols]],
+                    }
+                )
 
-            # Update in Sheets
-            range_a1 = f"Leads!A{row_idx}:M{row_idx}"
-            await self.update_values(range_a1, [existing_row])
-            logger.debug(f"Updated lead {user_id} at row {row_idx}")
+            try:
+                await self.batch_update_values(batch_data)
+            except Exception:
+                self.invalidate_leads_cache()
+                raise
+            # Patch the cached row only once the sheet has the values
+            for col, value in changes.items():
+                existing_row[col] = value
+            logger.debug("Updated lead %s at row %s", user_id, row_idx)
             return True
 
         else:
@@ -509,44 +710,49 @@ class SheetsClient:
                 notes or '',             # M: notes
             ]
 
-            await self.append_values("Leads!A1", [new_row])
-            logger.debug(f"Created new lead {user_id}")
+            resp = await self.append_values("Leads!A1", [new_row])
+            self._remember_new_lead(user_id, new_row, resp)
+            logger.debug("Created new lead %s", user_id)
             return True
 
+    def _lead_from_row(self, row: list[Any]) -> dict[str, Any]:
+        """Map a Leads row to a dict keyed by LEADS_COLUMNS, padding missing cells with ''."""
+        return dict(zip(self.LEADS_COLUMNS, row + self._EMPTY_LEAD_ROW[len(row):], strict=False))
+
     async def search_leads(self, query: str) -> list[dict[str, Any]]:
-        """Search leads by user_id or phone."""
-        rows, _ = await asyncio.to_thread(self._get_leads_data_sync)
+        """Search leads by user_id, phone or username (first LEADS_SEARCH_LIMIT matches)."""
+        rows, _ = await self._to_thread(self._get_leads_data_sync)
         results = []
 
         query_lower = query.lower().strip()
-        query_digits = ''.join(c for c in query if c.isdigit())
+        query_digits = _NON_DIGIT_RE.sub('', query)
+        to_lead = self._lead_from_row
 
         for row in rows:
             if not row:
                 continue
 
-            # Match user_id
-            user_id_str = str(row[0]) if row else ''
-            if query_digits and query_digits in user_id_str:
-                lead = dict(zip(self.LEADS_COLUMNS, row + [''] * (len(self.LEADS_COLUMNS) - len(row)), strict=False))
-                results.append(lead)
-                continue
-
-            # Match phone
-            phone = row[10] if len(row) > 10 else ''
-            phone_digits = ''.join(c for c in phone if c.isdigit())
-            if query_digits and query_digits in phone_digits:
-                lead = dict(zip(self.LEADS_COLUMNS, row + [''] * (len(self.LEADS_COLUMNS) - len(row)), strict=False))
-                results.append(lead)
-                continue
+            n = len(row)
+            if query_digits:
+                # Match user_id, then phone digits
+                if query_digits in str(row[0]):
+                    matched = True
+                else:
+                    phone = row[10] if n > 10 else ''
+                    matched = bool(phone) and query_digits in _NON_DIGIT_RE.sub('', phone)
+            else:
+                matched = False
 
             # Match username
-            username = row[1] if len(row) > 1 else ''
-            if query_lower and query_lower in username.lower():
-                lead = dict(zip(self.LEADS_COLUMNS, row + [''] * (len(self.LEADS_COLUMNS) - len(row)), strict=False))
-                results.append(lead)
+            if not matched and query_lower and n > 1:
+                matched = query_lower in row[1].lower()
+
+            if matched:
+                results.append(to_lead(row))
+                if len(results) >= LEADS_SEARCH_LIMIT:
+                    break
 
-        return results[:20]  # Limit results
+        return results
 
     async def update_daily_metrics(self, metrics: dict[str, Any]) -> bool:
         """
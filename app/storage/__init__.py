@@ -49,18 +49,21 @@ from .crm import (
     get_user_events,
     get_user_messages,
     get_user_messages_count,
+    get_user_order_totals,
     get_user_orders_count,
     get_user_stage,
     has_user_consent,
     log_crm_event,
+    log_crm_events,
     log_crm_message,
 )
-from .db import DB_PATH, init_db
+from .db import DB_PATH, close_db, init_db
 
 __all__ = [
     # Database
     "DB_PATH",
     "init_db",
+    "close_db",
     # Cart types
     "CartItem",
     "OrderIdGenerator",
@@ -98,9 +101,11 @@ __all__ = [
     "MAX_CRM_MESSAGES",
     # CRM functions
     "log_crm_event",
+    "log_crm_events",
     "get_user_events",
     "get_user_stage",
     "get_user_orders_count",
+    "get_user_order_totals",
     "get_daily_stats",
     "get_first_seen",
     "get_last_seen",
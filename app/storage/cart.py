@@ -3,13 +3,11 @@
 from __future__ import annotations
 
 import hashlib
-import json
 import logging
-from collections.abc import Callable
+import sys
+from collections.abc import Callable, Iterable
 
-import aiosqlite
-
-from .db import DB_PATH
+from .db import DB_PATH, get_db, transaction
 
 logger = logging.getLogger(__name__)
 
@@ -17,12 +15,16 @@ logger = logging.getLogger(__name__)
 CartItem = tuple[str, int]  # (sku, qty)
 OrderIdGenerator = Callable[[], str]
 
+# Shared by every path that drops a line, so sqlite3's per-connection
+# statement cache (keyed by SQL text) holds a single prepared DELETE
+_DELETE_ITEM_SQL = "DELETE FROM cart_items WHERE user_id = ? AND sku = ?"
+
 
 async def add_to_cart(user_id: int, sku: str, qty: int) -> None:
     """Add qty to cart. Supports negative qty for decrement."""
     if qty == 0:
         return
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         if qty > 0:
             await db.execute(
                 "INSERT INTO cart_items(user_id, sku, qty) VALUES(?, ?, ?) "
@@ -30,58 +32,48 @@ async def add_to_cart(user_id: int, sku: str, qty: int) -> None:
                 (user_id, sku, qty),
             )
         else:
-            # Decrement: update and remove if zero or negative
-            await db.execute(
-                "UPDATE cart_items SET qty = qty + ? WHERE user_id = ? AND sku = ?",
+            # Decrement: one statement in the common case, delete only when it hits zero
+            rows = await db.execute_fetchall(
+                "UPDATE cart_items SET qty = qty + ? WHERE user_id = ? AND sku = ? RETURNING qty",
                 (qty, user_id, sku),
             )
-            await db.execute(
-                "DELETE FROM cart_items WHERE user_id = ? AND sku = ? AND qty <= 0",
-                (user_id, sku),
-            )
-        await db.commit()
+            if rows and rows[0][0] <= 0:
+                await db.execute(_DELETE_ITEM_SQL, (user_id, sku))
 
 
 async def set_qty(user_id: int, sku: str, qty: int) -> None:
     """Set specific quantity for item in cart."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         if qty <= 0:
-            await db.execute(
-                "DELETE FROM cart_items WHERE user_id=? AND sku=?", (user_id, sku)
-            )
+            await db.execute(_DELETE_ITEM_SQL, (user_id, sku))
         else:
             await db.execute(
                 "INSERT INTO cart_items(user_id, sku, qty) VALUES(?, ?, ?) "
                 "ON CONFLICT(user_id, sku) DO UPDATE SET qty=excluded.qty",
                 (user_id, sku, qty),
             )
-        await db.commit()
 
 
 async def remove_from_cart(user_id: int, sku: str) -> None:
     """Remove item from cart entirely."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "DELETE FROM cart_items WHERE user_id=? AND sku=?", (user_id, sku)
-        )
-        await db.commit()
+    async with transaction(DB_PATH) as db:
+        await db.execute(_DELETE_ITEM_SQL, (user_id, sku))
 
 
 async def clear_cart(user_id: int) -> None:
     """Clear all items from cart."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         await db.execute("DELETE FROM cart_items WHERE user_id=?", (user_id,))
-        await db.commit()
 
 
-async def get_cart(user_id: int) -> list[CartItem]:
-    """Get cart contents as list of (sku, qty) tuples."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT sku, qty FROM cart_items WHERE user_id=? ORDER BY sku", (user_id,)
-        )
-        rows = await cur.fetchall()
-        return [(r[0], int(r[1])) for r in rows]
+async def get_cart(user_id: int) -> dict[str, int]:
+    """Get cart contents as {sku: qty}, ordered by SKU."""
+    db = await get_db(DB_PATH)
+    rows = await db.execute_fetchall(
+        "SELECT sku, qty FROM cart_items WHERE user_id=? ORDER BY sku", (user_id,)
+    )
+    # Interned to share the catalog's SKU objects (see ProductService)
+    return {sys.intern(r[0]): int(r[1]) for r in rows}
 
 
 # ---------------------------------------------------------------------------
@@ -89,15 +81,24 @@ async def get_cart(user_id: int) -> list[CartItem]:
 # ---------------------------------------------------------------------------
 
 
-def compute_cart_hash(cart_items: list[CartItem]) -> str:
-    """Compute a stable hash for cart contents to detect duplicate checkouts."""
-    data = json.dumps(sorted(cart_items), sort_keys=True)
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
+def compute_cart_hash(cart_items: Iterable[CartItem]) -> str:
+    """
+    Compute a stable hash for cart contents to detect duplicate checkouts.
+    Only used for dedup, so a fast non-cryptographic-strength digest is enough;
+    SKUs are length-prefixed so item boundaries are unambiguous.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for sku, qty in sorted(cart_items):
+        raw = sku.encode()
+        h.update(len(raw).to_bytes(2, "little"))
+        h.update(raw)
+        h.update(qty.to_bytes(4, "little", signed=True))
+    return h.hexdigest()
 
 
 async def get_or_create_checkout_session(
     user_id: int,
-    cart_items: list[CartItem],
+    cart_items: Iterable[CartItem],
     order_id_generator: OrderIdGenerator,
 ) -> tuple[str, bool]:
     """
@@ -106,20 +107,19 @@ async def get_or_create_checkout_session(
     """
     cart_hash = compute_cart_hash(cart_items)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
+    async with transaction(DB_PATH) as db:
+        rows = await db.execute_fetchall(
             "SELECT order_id, status FROM checkout_sessions WHERE user_id = ? AND cart_hash = ?",
             (user_id, cart_hash),
         )
-        row = await cur.fetchone()
 
-        if row:
+        if rows:
             logger.info(
                 "Found existing checkout session for user %s: order_id=%s",
                 user_id,
-                row[0],
+                rows[0][0],
             )
-            return row[0], False
+            return rows[0][0], False
 
         # Create new session
         order_id = order_id_generator()
@@ -127,28 +127,23 @@ async def get_or_create_checkout_session(
             "INSERT INTO checkout_sessions(user_id, cart_hash, order_id, status) VALUES(?, ?, ?, 'pending')",
             (user_id, cart_hash, order_id),
         )
-        await db.commit()
-        logger.info(
-            "Created new checkout session for user %s: order_id=%s", user_id, order_id
-        )
-        return order_id, True
+    logger.info("Created new checkout session for user %s: order_id=%s", user_id, order_id)
+    return order_id, True
 
 
 async def mark_checkout_complete(user_id: int, order_id: str) -> None:
     """Mark checkout session as completed."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         await db.execute(
             "UPDATE checkout_sessions SET status = 'completed' WHERE user_id = ? AND order_id = ?",
             (user_id, order_id),
         )
-        await db.commit()
 
 
 async def cleanup_old_checkout_sessions(user_id: int) -> None:
     """Remove old pending checkout sessions after successful order."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         await db.execute(
             "DELETE FROM checkout_sessions WHERE user_id = ? AND status = 'pending'",
             (user_id,),
         )
-        await db.commit()
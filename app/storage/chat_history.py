@@ -2,17 +2,29 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
 from typing import Literal, TypedDict
 
-import aiosqlite
+from .db import DB_PATH, get_db, transaction
 
-from .db import DB_PATH
-
-MAX_HISTORY_MESSAGES = 20  # Store last 20 messages per user
+MAX_HISTORY_MESSAGES = 20  # Store last 20 messages per user (see init_db trigger)
+AI_MODE_CACHE_MAXSIZE = 10_000  # Most recently used users kept in _ai_mode_cache
 
 # Type definitions
 MessageRole = Literal["user", "assistant", "system"]
 
+# AI mode per (DB_PATH, user_id). Only this module writes user_mode, so
+# set_ai_mode keeps the cache exact and reads skip SQLite after the first.
+# LRU: the least recently used user is dropped past AI_MODE_CACHE_MAXSIZE.
+_ai_mode_cache: OrderedDict[tuple[str, int], bool] = OrderedDict()
+
+
+def _cache_ai_mode(key: tuple[str, int], enabled: bool) -> None:
+    _ai_mode_cache[key] = enabled
+    _ai_mode_cache.move_to_end(key)
+    if len(_ai_mode_cache) > AI_MODE_CACHE_MAXSIZE:
+        _ai_mode_cache.popitem(last=False)
+
 
 class ChatMessage(TypedDict):
     """Chat message structure."""
@@ -23,59 +35,57 @@ class ChatMessage(TypedDict):
 
 async def add_chat_message(user_id: int, role: MessageRole, content: str) -> None:
     """Add a message to chat history. Role: 'user' or 'assistant' or 'system'."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    # Only the last MAX_HISTORY_MESSAGES are kept (trim_chat_history trigger)
+    async with transaction(DB_PATH) as db:
         await db.execute(
             "INSERT INTO chat_history(user_id, role, content) VALUES(?, ?, ?)",
             (user_id, role, content),
         )
-        # Remove old messages, keep only last N
-        await db.execute(
-            """
-            DELETE FROM chat_history
-            WHERE user_id = ? AND id NOT IN (
-                SELECT id FROM chat_history WHERE user_id = ?
-                ORDER BY created_at DESC LIMIT ?
-            )
-            """,
-            (user_id, user_id, MAX_HISTORY_MESSAGES),
-        )
-        await db.commit()
 
 
-async def get_chat_history(user_id: int) -> list[ChatMessage]:
-    """Get chat history for user as list of ChatMessage dicts."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT role, content FROM chat_history WHERE user_id = ? ORDER BY created_at ASC",
-            (user_id,),
-        )
-        rows = await cur.fetchall()
-        return [{"role": r[0], "content": r[1]} for r in rows]
+async def get_chat_history(user_id: int, limit: int | None = None) -> list[ChatMessage]:
+    """
+    Get the most recent chat messages for user (oldest first).
+    limit defaults to MAX_HISTORY_MESSAGES so the AI context stays bounded.
+    """
+    if limit is None:
+        limit = MAX_HISTORY_MESSAGES
+    db = await get_db(DB_PATH)
+    rows = await db.execute_fetchall(
+        "SELECT role, content FROM chat_history WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+        (user_id, limit),
+    )
+    return [{"role": role, "content": content} for role, content in reversed(rows)]
 
 
 async def clear_chat_history(user_id: int) -> None:
     """Clear chat history for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         await db.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
-        await db.commit()
 
 
 async def set_ai_mode(user_id: int, enabled: bool) -> None:
     """Set AI mode for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         await db.execute(
             "INSERT INTO user_mode(user_id, ai_mode) VALUES(?, ?) "
             "ON CONFLICT(user_id) DO UPDATE SET ai_mode=excluded.ai_mode",
             (user_id, 1 if enabled else 0),
         )
-        await db.commit()
+    _cache_ai_mode((DB_PATH, user_id), enabled)
 
 
 async def get_ai_mode(user_id: int) -> bool:
     """Check if AI mode is enabled for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT ai_mode FROM user_mode WHERE user_id=?", (user_id,)
-        )
-        row = await cur.fetchone()
-        return bool(row[0]) if row else False
+    key = (DB_PATH, user_id)
+    cached = _ai_mode_cache.get(key)
+    if cached is not None:
+        _ai_mode_cache.move_to_end(key)
+        return cached
+    db = await get_db(DB_PATH)
+    rows = await db.execute_fetchall(
+        "SELECT ai_mode FROM user_mode WHERE user_id=?", (user_id,)
+    )
+    enabled = bool(rows[0][0]) if rows else False
+    _cache_ai_mode(key, enabled)
+    return enabled
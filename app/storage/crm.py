@@ -4,12 +4,12 @@ from __future__ import annotations
 
 import json
 import logging
-from datetime import date
+from collections import OrderedDict
+from collections.abc import Iterable
+from datetime import date, timedelta
 from typing import Any, Literal, TypedDict
 
-import aiosqlite
-
-from .db import DB_PATH
+from .db import DB_PATH, get_db, transaction
 
 logger = logging.getLogger(__name__)
 
@@ -74,7 +74,30 @@ EVENT_TO_STAGE = {
     "order_created": "customer",  # or 'repeat' if orders_count >= 2
 }
 
-MAX_CRM_MESSAGES = 100  # Store last 100 messages per user
+# Stage resolution done in SQL: event_type -> priority, and priority -> stage
+_EVENT_PRIORITY_SQL = "CASE event_type {} ELSE 0 END".format(
+    " ".join(
+        f"WHEN '{event}' THEN {STAGE_PRIORITY[stage]}" for event, stage in EVENT_TO_STAGE.items()
+    )
+)
+_PRIORITY_TO_STAGE = {priority: stage for stage, priority in STAGE_PRIORITY.items()}
+_USER_STAGE_SQL = f"SELECT MAX({_EVENT_PRIORITY_SQL}) FROM crm_events WHERE user_id = ?"
+
+# Numeric $.total of an event payload, NULL otherwise; malformed JSON is skipped
+_PAYLOAD_TOTAL_SQL = """
+    CASE WHEN json_valid(payload_json) THEN
+        CASE WHEN json_type(payload_json, '$.total') IN ('integer', 'real')
+             THEN json_extract(payload_json, '$.total') END
+    END
+"""
+
+# (DB_PATH, user_id) of users known to have consented. Consent is never
+# revoked, so only positive answers are cached. Used as an LRU set: the least
+# recently checked user is dropped past CONSENT_CACHE_MAXSIZE.
+_consented: OrderedDict[tuple[str, int], None] = OrderedDict()
+
+MAX_CRM_MESSAGES = 100  # Store last 100 messages per user (see init_db trigger)
+CONSENT_CACHE_MAXSIZE = 10_000  # Most recently used users kept in _consented
 
 
 # ---------------------------------------------------------------------------
@@ -89,17 +112,34 @@ async def log_crm_event(
 ) -> int:
     """Log a CRM event to SQLite. Returns the event_id."""
     payload_json = json.dumps(payload, ensure_ascii=False) if payload else None
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         cursor = await db.execute(
             "INSERT INTO crm_events(user_id, event_type, payload_json) VALUES(?, ?, ?)",
             (user_id, event_type, payload_json),
         )
         event_id = cursor.lastrowid
-        await db.commit()
-        logger.debug(
-            "CRM event logged: user=%s, type=%s, id=%s", user_id, event_type, event_id
+    logger.debug(
+        "CRM event logged: user=%s, type=%s, id=%s", user_id, event_type, event_id
+    )
+    return event_id
+
+
+async def log_crm_events(
+    events: Iterable[tuple[int, str, dict[str, Any] | None]],
+) -> None:
+    """Log several CRM events (user_id, event_type, payload) in one transaction."""
+    rows = [
+        (user_id, event_type, json.dumps(payload, ensure_ascii=False) if payload else None)
+        for user_id, event_type, payload in events
+    ]
+    if not rows:
+        return
+    async with transaction(DB_PATH) as db:
+        await db.executemany(
+            "INSERT INTO crm_events(user_id, event_type, payload_json) VALUES(?, ?, ?)",
+            rows,
         )
-        return event_id
+    logger.debug("CRM events logged: %s rows", len(rows))
 
 
 async def get_user_events(
@@ -108,82 +148,71 @@ async def get_user_events(
     event_types: list[str] | None = None,
 ) -> list[CrmEvent]:
     """Get CRM events for a user. Returns list of CrmEvent dicts."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        if event_types:
-            placeholders = ",".join("?" * len(event_types))
-            query = f"""
-                SELECT id, event_type, payload_json, created_at
-                FROM crm_events
-                WHERE user_id = ? AND event_type IN ({placeholders})
-                ORDER BY created_at DESC
-                LIMIT ?
-            """
-            params = [user_id, *event_types, limit]
-        else:
-            query = """
-                SELECT id, event_type, payload_json, created_at
-                FROM crm_events
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """
-            params = [user_id, limit]
-
-        cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
-
-        events = []
-        for row in rows:
-            payload = json.loads(row[2]) if row[2] else None
-            events.append(
-                {
-                    "id": row[0],
-                    "event_type": row[1],
-                    "payload": payload,
-                    "created_at": row[3],
-                }
-            )
-        return events
+    db = await get_db(DB_PATH)
+    if event_types:
+        placeholders = ",".join("?" * len(event_types))
+        query = f"""
+            SELECT id, event_type, payload_json, created_at
+            FROM crm_events
+            WHERE user_id = ? AND event_type IN ({placeholders})
+            ORDER BY created_at DESC
+            LIMIT ?
+        """
+        params = [user_id, *event_types, limit]
+    else:
+        query = """
+            SELECT id, event_type, payload_json, created_at
+            FROM crm_events
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        """
+        params = [user_id, limit]
+
+    rows = await db.execute_fetchall(query, params)
+    return [
+        {
+            "id": event_id,
+            "event_type": event_type,
+            "payload": json.loads(payload_json) if payload_json else None,
+            "created_at": created_at,
+        }
+        for event_id, event_type, payload_json, created_at in rows
+    ]
 
 
 async def get_user_stage(user_id: int) -> CrmStage | None:
     """Calculate current CRM stage for user based on their events."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT DISTINCT event_type FROM crm_events WHERE user_id = ?",
-            (user_id,),
-        )
-        rows = await cursor.fetchall()
-
-        if not rows:
-            return None
-
-        event_types = [row[0] for row in rows]
-
-        # Find highest stage based on events
-        max_priority = 0
-        max_stage = None
-
-        for event_type in event_types:
-            stage = EVENT_TO_STAGE.get(event_type)
-            if stage:
-                priority = STAGE_PRIORITY.get(stage, 0)
-                if priority > max_priority:
-                    max_priority = priority
-                    max_stage = stage
-
-        return max_stage
+    db = await get_db(DB_PATH)
+    rows = await db.execute_fetchall(_USER_STAGE_SQL, (user_id,))
+    # NULL without events; 0 when only unmapped event types were logged
+    return _PRIORITY_TO_STAGE.get(rows[0][0]) if rows else None
 
 
 async def get_user_orders_count(user_id: int) -> int:
     """Count order_created events for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM crm_events WHERE user_id = ? AND event_type = 'order_created'",
-            (user_id,),
-        )
-        row = await cursor.fetchone()
-        return row[0] if row else 0
+    db = await get_db(DB_PATH)
+    cursor = await db.execute(
+        "SELECT COUNT(*) FROM crm_events WHERE user_id = ? AND event_type = 'order_created'",
+        (user_id,),
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else 0
+
+
+async def get_user_order_totals(user_id: int) -> tuple[int, int | float]:
+    """Get (orders_count, lifetime_value) from the user's order_created events."""
+    db = await get_db(DB_PATH)
+    rows = await db.execute_fetchall(
+        f"""
+        SELECT COUNT(*), COALESCE(SUM({_PAYLOAD_TOTAL_SQL}), 0)
+        FROM crm_events
+        WHERE user_id = ? AND event_type = 'order_created'
+        """,
+        (user_id,),
+    )
+    orders_count, lifetime_value = rows[0]
+    return orders_count, lifetime_value
 
 
 async def get_daily_stats(target_date: str | date | None = None) -> DailyStats:
@@ -193,111 +222,79 @@ async def get_daily_stats(target_date: str | date | None = None) -> DailyStats:
     elif isinstance(target_date, date):
         target_date = target_date.isoformat()
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        stats = {
-            "date": target_date,
-            "visitors": 0,
-            "engaged": 0,
-            "cart": 0,
-            "checkout": 0,
-            "orders": 0,
-            "orders_total": 0,
-        }
-
-        # Visitors (unique users with 'start' event)
-        cursor = await db.execute(
-            """
-            SELECT COUNT(DISTINCT user_id)
-            FROM crm_events
-            WHERE event_type = 'start' AND DATE(created_at) = ?
-            """,
-            (target_date,),
-        )
-        row = await cursor.fetchone()
-        stats["visitors"] = row[0] if row else 0
-
-        # Engaged (unique users who viewed catalog/product/search)
-        cursor = await db.execute(
-            """
-            SELECT COUNT(DISTINCT user_id)
-            FROM crm_events
-            WHERE event_type IN ('catalog_view', 'product_view', 'search')
-            AND DATE(created_at) = ?
-            """,
-            (target_date,),
-        )
-        row = await cursor.fetchone()
-        stats["engaged"] = row[0] if row else 0
-
-        # Cart (unique users who added to cart)
-        cursor = await db.execute(
-            """
-            SELECT COUNT(DISTINCT user_id)
-            FROM crm_events
-            WHERE event_type = 'add_to_cart' AND DATE(created_at) = ?
-            """,
-            (target_date,),
-        )
-        row = await cursor.fetchone()
-        stats["cart"] = row[0] if row else 0
-
-        # Checkout started
-        cursor = await db.execute(
-            """
-            SELECT COUNT(DISTINCT user_id)
-            FROM crm_events
-            WHERE event_type = 'checkout_started' AND DATE(created_at) = ?
-            """,
-            (target_date,),
-        )
-        row = await cursor.fetchone()
-        stats["checkout"] = row[0] if row else 0
-
-        # Orders created and sum totals
-        cursor = await db.execute(
-            """
-            SELECT payload_json
-            FROM crm_events
-            WHERE event_type = 'order_created' AND DATE(created_at) = ?
-            """,
-            (target_date,),
-        )
-        order_rows = await cursor.fetchall()
-        stats["orders"] = len(order_rows)
-
-        total = 0
-        for row in order_rows:
-            if row[0]:
-                try:
-                    payload = json.loads(row[0])
-                    total += payload.get("total", 0)
-                except (json.JSONDecodeError, TypeError):
-                    pass
-        stats["orders_total"] = total
-
+    stats = {
+        "date": target_date,
+        "visitors": 0,
+        "engaged": 0,
+        "cart": 0,
+        "checkout": 0,
+        "orders": 0,
+        "orders_total": 0,
+    }
+
+    # created_at is 'YYYY-MM-DD HH:MM:SS', so a half-open string range selects
+    # the day and, unlike DATE(created_at), can use idx_crm_events_type
+    day_start = target_date
+    try:
+        day_end = (date.fromisoformat(target_date) + timedelta(days=1)).isoformat()
+    except ValueError:
+        # Not a YYYY-MM-DD date: no events can match, as with DATE(created_at) = ?
         return stats
 
+    db = await get_db(DB_PATH)
+
+    # Funnel counts (unique users per step) and order count/total in one scan
+    rows = await db.execute_fetchall(
+        f"""
+        SELECT
+            COUNT(DISTINCT CASE WHEN event_type = 'start' THEN user_id END),
+            COUNT(DISTINCT CASE WHEN event_type IN ('catalog_view', 'product_view', 'search')
+                           THEN user_id END),
+            COUNT(DISTINCT CASE WHEN event_type = 'add_to_cart' THEN user_id END),
+            COUNT(DISTINCT CASE WHEN event_type = 'checkout_started' THEN user_id END),
+            COUNT(CASE WHEN event_type = 'order_created' THEN 1 END),
+            COALESCE(SUM(
+                CASE WHEN event_type = 'order_created' THEN {_PAYLOAD_TOTAL_SQL} END
+            ), 0)
+        FROM crm_events
+        WHERE event_type IN ('start', 'catalog_view', 'product_view', 'search',
+                             'add_to_cart', 'checkout_started', 'order_created')
+        AND created_at >= ? AND created_at < ?
+        """,
+        (day_start, day_end),
+    )
+    (
+        stats["visitors"],
+        stats["engaged"],
+        stats["cart"],
+        stats["checkout"],
+        stats["orders"],
+        stats["orders_total"],
+    ) = rows[0]
+
+    return stats
+
 
 async def get_first_seen(user_id: int) -> str | None:
     """Get timestamp of first event for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT MIN(created_at) FROM crm_events WHERE user_id = ?",
-            (user_id,),
-        )
-        row = await cursor.fetchone()
-        return row[0] if row and row[0] else None
+    db = await get_db(DB_PATH)
+    cursor = await db.execute(
+        "SELECT MIN(created_at) FROM crm_events WHERE user_id = ?",
+        (user_id,),
+    )
+    row = await cursor.fetchone()
+    return row[0] if row and row[0] else None
 
 
 async def get_last_seen(user_id: int) -> str | None:
     """Get timestamp of last event for user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT MAX(created_at) FROM crm_events WHERE user_id = ?",
-            (user_id,),
-        )
-        row = await cursor.fetchone()
-        return row[0] if row and row[0] else None
+    db = await get_db(DB_PATH)
+    cursor = await db.execute(
+        "SELECT MAX(created_at) FROM crm_events WHERE user_id = ?",
+        (user_id,),
+    )
+    row = await cursor.fetchone()
+    return row[0] if row and row[0] else None
 
 
 def compute_stage(current_stage: CrmStage | None, new_stage: CrmStage) -> CrmStage:
@@ -329,7 +326,7 @@ async def log_crm_message(
     if len(text) > 2000:
         text = text[:2000] + "..."
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with transaction(DB_PATH) as db:
         cursor = await db.execute(
             """
             INSERT INTO crm_messages(user_id, direction, message_type, text)
@@ -337,25 +334,13 @@ async def log_crm_message(
             """,
             (user_id, direction, message_type, text),
         )
+        # Only the last MAX_CRM_MESSAGES are kept (trim_crm_messages trigger)
         message_id = cursor.lastrowid
 
-        # Cleanup old messages, keep only last N
-        await db.execute(
-            """
-            DELETE FROM crm_messages
-            WHERE user_id = ? AND id NOT IN (
-                SELECT id FROM crm_messages WHERE user_id = ?
-                ORDER BY created_at DESC LIMIT ?
-            )
-            """,
-            (user_id, user_id, MAX_CRM_MESSAGES),
-        )
-        await db.commit()
-
-        logger.debug(
-            "CRM message logged: user=%s, dir=%s, id=%s", user_id, direction, message_id
-        )
-        return message_id
+    logger.debug(
+        "CRM message logged: user=%s, dir=%s, id=%s", user_id, direction, message_id
+    )
+    return message_id
 
 
 async def get_user_messages(
@@ -364,79 +349,90 @@ async def get_user_messages(
     direction: MessageDirection | None = None,
 ) -> list[CrmMessage]:
     """Get CRM messages for a user. Returns list of CrmMessage dicts."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        if direction:
-            query = """
-                SELECT id, direction, message_type, text, created_at
-                FROM crm_messages
-                WHERE user_id = ? AND direction = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """
-            params = [user_id, direction, limit]
-        else:
-            query = """
-                SELECT id, direction, message_type, text, created_at
-                FROM crm_messages
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            """
-            params = [user_id, limit]
-
-        cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
-
-        messages = []
-        for row in rows:
-            messages.append(
-                {
-                    "id": row[0],
-                    "direction": row[1],
-                    "message_type": row[2],
-                    "text": row[3],
-                    "created_at": row[4],
-                }
-            )
-
-        # Return in chronological order (oldest first)
-        return list(reversed(messages))
+    db = await get_db(DB_PATH)
+    if direction:
+        query = """
+            SELECT id, direction, message_type, text, created_at
+            FROM crm_messages
+            WHERE user_id = ? AND direction = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        """
+        params = [user_id, direction, limit]
+    else:
+        query = """
+            SELECT id, direction, message_type, text, created_at
+            FROM crm_messages
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        """
+        params = [user_id, limit]
+
+    rows = await db.execute_fetchall(query, params)
+    # Return in chronological order (oldest first)
+    return [
+        {
+            "id": message_id,
+            "direction": direction,
+            "message_type": message_type,
+            "text": text,
+            "created_at": created_at,
+        }
+        for message_id, direction, message_type, text, created_at in reversed(rows)
+    ]
 
 
 async def get_user_messages_count(user_id: int) -> int:
     """Count total messages for a user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM crm_messages WHERE user_id = ?",
-            (user_id,),
-        )
-        row = await cursor.fetchone()
-        return row[0] if row else 0
+    db = await get_db(DB_PATH)
+    cursor = await db.execute(
+        "SELECT COUNT(*) FROM crm_messages WHERE user_id = ?",
+        (user_id,),
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else 0
 
 
 async def has_user_consent(user_id: int) -> bool:
     """Check if user has given consent for message logging."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM crm_events WHERE user_id = ? AND event_type = 'start'",
-            (user_id,),
-        )
-        row = await cursor.fetchone()
-        return (row[0] if row else 0) > 0
+    key = (DB_PATH, user_id)
+    if key in _consented:
+        _consented.move_to_end(key)
+        return True
+    db = await get_db(DB_PATH)
+    # EXISTS stops at the first matching index entry instead of counting all
+    rows = await db.execute_fetchall(
+        "SELECT EXISTS(SELECT 1 FROM crm_events WHERE user_id = ? AND event_type = 'start')",
+        (user_id,),
+    )
+    if rows[0][0]:
+        _consented[key] = None
+        if len(_consented) > CONSENT_CACHE_MAXSIZE:
+            _consented.popitem(last=False)
+        return True
+    return False
 
 
 async def format_messages_for_ai(user_id: int, limit: int = 20) -> str:
     """Format user messages for AI summarization."""
-    messages = await get_user_messages(user_id, limit=limit)
-
-    if not messages:
-        return ""
-
-    lines = []
-    for msg in messages:
-        direction = "👤 Клиент" if msg["direction"] == "in" else "🤖 Бот"
-        text = msg["text"][:200] + "..." if len(msg["text"]) > 200 else msg["text"]
-        timestamp = msg["created_at"][:16] if msg["created_at"] else ""
-        lines.append(f"[{timestamp}] {direction}: {text}")
-
-    return "\n".join(lines)
+    db = await get_db(DB_PATH)
+    # Only the formatted columns, with truncation done by SQLite
+    rows = await db.execute_fetchall(
+        """
+        SELECT direction,
+               CASE WHEN length(text) > 200 THEN substr(text, 1, 200) || '...' ELSE text END,
+               COALESCE(substr(created_at, 1, 16), '')
+        FROM crm_messages
+        WHERE user_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+        """,
+        (user_id, limit),
+    )
+
+    # Rows are newest first; emit oldest first
+    return "\n".join(
+        f"[{timestamp}] {'👤 Клиент' if direction == 'in' else '🤖 Бот'}: {text}"
+        for direction, text, timestamp in reversed(rows)
+    )
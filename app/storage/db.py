@@ -2,8 +2,11 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import aiosqlite
@@ -22,10 +25,94 @@ else:
     _DATA_DIR.mkdir(exist_ok=True)
     DB_PATH = str(_DATA_DIR / "bot.sqlite3")
 
+# Applied to the shared connection. WAL is persistent in the file; the rest
+# are per-connection. mmap serves reads without a read() syscall per page,
+# and cache_size (negative = KiB) keeps ~40 MB of pages hot.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-40000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Shared long-lived connection (see get_db)
+_conn: aiosqlite.Connection | None = None
+_conn_path: str | None = None
+# Serializes write transactions on the shared connection (see transaction)
+_write_lock = asyncio.Lock()
+
+
+async def get_db(path: str) -> aiosqlite.Connection:
+    """
+    Get the shared connection for path, opening it on first use.
+
+    Storage modules pass their own DB_PATH so tests can patch it per module.
+    In production the path never changes; the close-and-reopen on a different
+    path exists only as that test hook. Callers must not close the returned
+    connection; call close_db() on shutdown instead. Writes go through
+    transaction().
+    """
+    global _conn, _conn_path
+    if _conn is not None and _conn_path == path:
+        return _conn
+
+    conn = aiosqlite.connect(path)
+    # Worker thread must not block interpreter exit if close_db() is skipped
+    conn.daemon = True
+    await conn
+    for pragma in _CONNECTION_PRAGMAS:
+        await conn.execute(pragma)
+
+    if _conn is not None and _conn_path == path:
+        # Another coroutine opened it while we were connecting
+        await conn.close()
+        return _conn
+
+    previous = _conn
+    _conn, _conn_path = conn, path
+    if previous is not None:
+        await previous.close()
+    return conn
+
+
+@asynccontextmanager
+async def transaction(path: str) -> AsyncIterator[aiosqlite.Connection]:
+    """
+    Run a write on the shared connection: commit on success, roll back on error.
+
+    Writers are serialized so one coroutine's commit or rollback never covers
+    another's half-done statements on the same connection.
+    """
+    async with _write_lock:
+        db = await get_db(path)
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+
+
+async def close_db() -> None:
+    """Close the shared connection, if open."""
+    global _conn, _conn_path
+    conn, _conn, _conn_path = _conn, None, None
+    if conn is not None:
+        # Refresh query planner stats for whatever this process ran
+        try:
+            await conn.execute("PRAGMA optimize")
+        except Exception as e:
+            logger.warning("PRAGMA optimize failed: %s", e)
+        await conn.close()
+
 
 async def init_db() -> None:
     """Initialize all database tables."""
     async with aiosqlite.connect(DB_PATH) as db:
+        # Switch the file to WAL up front so readers never queue behind writers
+        await db.execute("PRAGMA journal_mode=WAL")
+
         # Cart items
         await db.execute(
             """
@@ -79,6 +166,9 @@ async def init_db() -> None:
         await db.execute(
             "CREATE INDEX IF NOT EXISTS idx_chat_user ON chat_history(user_id, created_at)"
         )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_user_id ON chat_history(user_id, id)"
+        )
 
         # CRM events table
         await db.execute(
@@ -98,6 +188,12 @@ async def init_db() -> None:
         await db.execute(
             "CREATE INDEX IF NOT EXISTS idx_crm_events_type ON crm_events(event_type, created_at)"
         )
+        # Covers the per-user event_type lookups (stage, orders count, consent)
+        # so they are answered from the index without touching table rows
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_crm_events_user_type "
+            "ON crm_events(user_id, event_type, created_at)"
+        )
 
         # CRM messages table
         await db.execute(
@@ -115,5 +211,30 @@ async def init_db() -> None:
         await db.execute(
             "CREATE INDEX IF NOT EXISTS idx_crm_messages_user ON crm_messages(user_id, created_at)"
         )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_crm_messages_user_id ON crm_messages(user_id, id)"
+        )
+
+        # Per-user history caps, enforced on insert by walking (user_id, id)
+        # backwards. Recreated each start so a changed limit takes effect.
+        from . import chat_history, crm
+
+        for table, keep in (
+            ("chat_history", chat_history.MAX_HISTORY_MESSAGES),
+            ("crm_messages", crm.MAX_CRM_MESSAGES),
+        ):
+            await db.execute(f"DROP TRIGGER IF EXISTS trim_{table}")
+            await db.execute(
+                f"""
+                CREATE TRIGGER trim_{table} AFTER INSERT ON {table}
+                BEGIN
+                    DELETE FROM {table}
+                    WHERE user_id = NEW.user_id AND id <= (
+                        SELECT id FROM {table} WHERE user_id = NEW.user_id
+                        ORDER BY id DESC LIMIT 1 OFFSET {int(keep)}
+                    );
+                END
+                """
+            )
 
         await db.commit()
@@ -14,6 +14,7 @@ _test_db_fd, _test_db_path = tempfile.mkstemp(suffix=".db")
 os.environ["SHOP_BOT_TEST_DB_PATH"] = _test_db_path
 
 # Now we can import storage modules
+from app.storage import chat_history, crm
 from app.storage.db import DB_PATH, init_db
 
 
@@ -47,6 +48,10 @@ async def clean_database(database: str) -> AsyncGenerator[None, None]:
         await db.execute("DELETE FROM chat_history")
         await db.commit()
 
+    # Per-user caches are keyed by DB path, which this session shares
+    chat_history._ai_mode_cache.clear()
+    crm._consented.clear()
+
     yield
 
 
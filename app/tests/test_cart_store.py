@@ -11,7 +11,7 @@ async def test_add_to_cart_new_item(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU001", 2)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 2)]
+    assert items == {"SKU001": 2}
 
 
 @pytest.mark.asyncio
@@ -21,7 +21,7 @@ async def test_add_to_cart_increment(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU001", 3)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 5)]
+    assert items == {"SKU001": 5}
 
 
 @pytest.mark.asyncio
@@ -31,7 +31,7 @@ async def test_add_to_cart_decrement(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU001", -2)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 3)]
+    assert items == {"SKU001": 3}
 
 
 @pytest.mark.asyncio
@@ -41,7 +41,17 @@ async def test_add_to_cart_decrement_removes_item(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU001", -2)
 
     items = await cart.get_cart(user_id)
-    assert items == []
+    assert items == {}
+
+
+@pytest.mark.asyncio
+async def test_add_to_cart_decrement_missing_item_noop(user_id: int) -> None:
+    """Test that decrementing an item not in the cart leaves the cart unchanged."""
+    await cart.add_to_cart(user_id, "SKU001", 2)
+    await cart.add_to_cart(user_id, "SKU002", -1)
+
+    items = await cart.get_cart(user_id)
+    assert items == {"SKU001": 2}
 
 
 @pytest.mark.asyncio
@@ -51,7 +61,7 @@ async def test_add_to_cart_zero_qty_noop(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU001", 0)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 2)]
+    assert items == {"SKU001": 2}
 
 
 @pytest.mark.asyncio
@@ -61,7 +71,7 @@ async def test_set_qty(user_id: int) -> None:
     await cart.set_qty(user_id, "SKU001", 10)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 10)]
+    assert items == {"SKU001": 10}
 
 
 @pytest.mark.asyncio
@@ -71,7 +81,7 @@ async def test_set_qty_zero_removes(user_id: int) -> None:
     await cart.set_qty(user_id, "SKU001", 0)
 
     items = await cart.get_cart(user_id)
-    assert items == []
+    assert items == {}
 
 
 @pytest.mark.asyncio
@@ -82,7 +92,7 @@ async def test_remove_from_cart(user_id: int) -> None:
     await cart.remove_from_cart(user_id, "SKU001")
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU002", 3)]
+    assert items == {"SKU002": 3}
 
 
 @pytest.mark.asyncio
@@ -93,14 +103,14 @@ async def test_clear_cart(user_id: int) -> None:
     await cart.clear_cart(user_id)
 
     items = await cart.get_cart(user_id)
-    assert items == []
+    assert items == {}
 
 
 @pytest.mark.asyncio
 async def test_get_cart_empty(user_id: int) -> None:
     """Test getting empty cart."""
     items = await cart.get_cart(user_id)
-    assert items == []
+    assert items == {}
 
 
 @pytest.mark.asyncio
@@ -111,7 +121,7 @@ async def test_get_cart_sorted_by_sku(user_id: int) -> None:
     await cart.add_to_cart(user_id, "SKU002", 3)
 
     items = await cart.get_cart(user_id)
-    assert items == [("SKU001", 2), ("SKU002", 3), ("SKU003", 1)]
+    assert list(items.items()) == [("SKU001", 2), ("SKU002", 3), ("SKU003", 1)]
 
 
 @pytest.mark.asyncio
@@ -123,8 +133,27 @@ async def test_cart_isolation_between_users(user_id: int, another_user_id: int)
     user1_items = await cart.get_cart(user_id)
     user2_items = await cart.get_cart(another_user_id)
 
-    assert user1_items == [("SKU001", 2)]
-    assert user2_items == [("SKU002", 5)]
+    assert user1_items == {"SKU001": 2}
+    assert user2_items == {"SKU002": 5}
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_rolled_back(user_id: int) -> None:
+    """Test that a failed write is not committed by the next writer."""
+    from app.storage.db import transaction
+
+    with pytest.raises(RuntimeError):
+        async with transaction(cart.DB_PATH) as db:
+            await db.execute(
+                "INSERT INTO cart_items(user_id, sku, qty) VALUES(?, ?, ?)",
+                (user_id, "SKU001", 2),
+            )
+            raise RuntimeError("write failed halfway")
+
+    await cart.add_to_cart(user_id, "SKU002", 1)
+
+    items = await cart.get_cart(user_id)
+    assert items == {"SKU002": 1}
 
 
 # Checkout session tests
@@ -154,6 +183,18 @@ async def test_compute_cart_hash_order_independent() -> None:
     assert hash1 == hash2
 
 
+@pytest.mark.asyncio
+async def test_compute_cart_hash_accepts_cart_items_view(user_id: int) -> None:
+    """Test hashing get_cart().items() matches the (sku, qty) list form."""
+    await cart.add_to_cart(user_id, "SKU002", 3)
+    await cart.add_to_cart(user_id, "SKU001", 2)
+    items = await cart.get_cart(user_id)
+
+    assert cart.compute_cart_hash(items.items()) == cart.compute_cart_hash(
+        [("SKU001", 2), ("SKU002", 3)]
+    )
+
+
 @pytest.mark.asyncio
 async def test_get_or_create_checkout_session_new(user_id: int) -> None:
     """Test creating new checkout session."""
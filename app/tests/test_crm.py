@@ -27,6 +27,22 @@ async def test_log_crm_event_no_payload(user_id: int) -> None:
     assert events[0]["payload"] is None
 
 
+@pytest.mark.asyncio
+async def test_log_crm_events_batch(user_id: int, another_user_id: int) -> None:
+    """Test logging several events in one call."""
+    await crm.log_crm_events(
+        [
+            (user_id, "catalog_view", None),
+            (user_id, "add_to_cart", {"sku": "SKU001"}),
+            (another_user_id, "start", {}),
+        ]
+    )
+
+    events = await crm.get_user_events(user_id)
+    assert sorted(e["event_type"] for e in events) == ["add_to_cart", "catalog_view"]
+    assert await crm.get_user_stage(another_user_id) == "new"
+
+
 @pytest.mark.asyncio
 async def test_get_user_events_filtered(user_id: int) -> None:
     """Test getting filtered events by type."""
@@ -91,6 +107,45 @@ async def test_get_user_messages_limit(user_id: int) -> None:
     assert len(messages) == 5
 
 
+@pytest.mark.asyncio
+async def test_format_messages_for_ai_truncates_long_text(user_id: int) -> None:
+    """Test long messages are cut to 200 chars and lines are oldest first."""
+    await crm.log_crm_message(user_id, "in", "я" * 250)
+    await crm.log_crm_message(user_id, "out", "ok")
+
+    lines = (await crm.format_messages_for_ai(user_id)).split("\n")
+
+    assert lines[0].endswith("👤 Клиент: " + "я" * 200 + "...")
+    assert lines[1].endswith("🤖 Бот: ok")
+    assert await crm.format_messages_for_ai(user_id + 1) == ""
+
+
+@pytest.mark.asyncio
+async def test_has_user_consent_caches_only_positive(user_id: int) -> None:
+    """Test a missing consent is rechecked, a granted one is remembered."""
+    assert await crm.has_user_consent(user_id) is False
+
+    await crm.log_crm_event(user_id, "start", None)
+    assert await crm.has_user_consent(user_id) is True
+    assert (crm.DB_PATH, user_id) in crm._consented
+
+
+@pytest.mark.asyncio
+async def test_consent_cache_evicts_least_recently_used(
+    monkeypatch: pytest.MonkeyPatch, user_id: int, another_user_id: int
+) -> None:
+    """Test the consent cache stays capped and drops the least recently used user."""
+    monkeypatch.setattr(crm, "CONSENT_CACHE_MAXSIZE", 1)
+    await crm.log_crm_event(user_id, "start", None)
+    await crm.log_crm_event(another_user_id, "start", None)
+
+    assert await crm.has_user_consent(user_id) is True
+    assert await crm.has_user_consent(another_user_id) is True
+
+    assert list(crm._consented) == [(crm.DB_PATH, another_user_id)]
+    assert await crm.has_user_consent(user_id) is True
+
+
 @pytest.mark.asyncio
 async def test_events_isolation_between_users(user_id: int, another_user_id: int) -> None:
     """Test that events are isolated between users."""
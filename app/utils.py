@@ -6,23 +6,28 @@ import re
 import string
 from datetime import UTC, datetime
 
+_ORDER_ID_ALPHABET = string.ascii_uppercase + string.digits
+
 
 def make_order_id(prefix: str = "ORD") -> str:
     ts = datetime.now(UTC).strftime("%y%m%d%H%M%S")
-    rnd = "".join(random.choices(string.ascii_uppercase + string.digits, k=4))
+    rnd = "".join(random.choices(_ORDER_ID_ALPHABET, k=4))
     return f"{prefix}-{ts}-{rnd}"
 
 
 def escape_html(text: str) -> str:
     """
     Escape special characters for Telegram HTML parse mode.
-    Handles: < > & and preserves other characters.
+    Handles: < > & and preserves other characters (quotes need no escaping
+    in message text, so html.escape skips its two quote passes).
     """
-    return html.escape(str(text))
+    return html.escape(str(text), quote=False)
 
 
-# Phone validation regex: accepts international formats
-_PHONE_RE = re.compile(r"^\+?[0-9]{10,15}$")
+# Phone validation regex: accepts international formats (used with fullmatch)
+_PHONE_RE = re.compile(r"\+?[0-9]{10,15}")
+# Separators stripped before validation: whitespace, dashes, parentheses
+_PHONE_CLEAN_RE = re.compile(r"[\s\-()]")
 
 
 def validate_phone(phone: str) -> tuple[bool, str]:
@@ -31,9 +36,9 @@ def validate_phone(phone: str) -> tuple[bool, str]:
     Returns (is_valid, cleaned_phone_or_error).
     """
     # Remove spaces, dashes, parentheses
-    cleaned = re.sub(r"[\s\-\(\)]", "", phone.strip())
+    cleaned = _PHONE_CLEAN_RE.sub("", phone.strip())
     if not cleaned:
         return False, "Номер телефона не указан"
-    if not _PHONE_RE.match(cleaned):
+    if not _PHONE_RE.fullmatch(cleaned):
         return False, "Некорректный формат телефона. Пример: +79991234567"
     return True, cleaned
@@ -1,6 +1,8 @@
 """Cloudinary client for photo uploads."""
 
+import asyncio
 import logging
+from functools import lru_cache
 from pathlib import Path
 
 import cloudinary
@@ -17,17 +19,14 @@ class CloudinaryClient:
 
     def __init__(self):
         settings = get_settings()
-        cloudinary.config(
-            cloud_name=settings.cloudinary_cloud_name,
-            api_key=settings.cloudinary_api_key,
-            api_secret=settings.cloudinary_api_secret,
-            secure=True,
-        )
-        self._configured = bool(
-            settings.cloudinary_cloud_name
-            and settings.cloudinary_api_key
-            and settings.cloudinary_api_secret
-        )
+        self._configured = settings.cloudinary_enabled
+        if self._configured:
+            cloudinary.config(
+                cloud_name=settings.cloudinary_cloud_name,
+                api_key=settings.cloudinary_api_key,
+                api_secret=settings.cloudinary_api_secret,
+                secure=True,
+            )
 
     async def upload_photo(self, file_path: str, filename: str) -> DriveUploadResult:
         """Upload photo to Cloudinary.
@@ -50,7 +49,8 @@ class CloudinaryClient:
         try:
             public_id = Path(filename).stem
 
-            result = cloudinary.uploader.upload(
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload,
                 file_path,
                 public_id=public_id,
                 folder="mahorka_products",
@@ -92,11 +92,14 @@ class CloudinaryClient:
             return False
 
         try:
-            result = cloudinary.uploader.destroy(public_id)
+            result = await asyncio.to_thread(cloudinary.uploader.destroy, public_id)
             return result.get("result") == "ok"
         except Exception as e:
             logger.exception("Failed to delete photo from Cloudinary: %s", e)
             return False
 
 
-cloudinary_client = CloudinaryClient()
+@lru_cache
+def get_cloudinary_client() -> CloudinaryClient:
+    """Get the shared Cloudinary client, configuring it on first use."""
+    return CloudinaryClient()
@@ -114,17 +114,25 @@ class Settings(BaseSettings):
 
     def get_google_credentials_info(self) -> dict:
         """Get Google service account credentials as dictionary."""
-        if self.google_service_account_json_b64:
-            decoded = base64.b64decode(self.google_service_account_json_b64)
-            return json.loads(decoded)
+        return _load_google_credentials(
+            self.google_service_account_json_b64,
+            self.google_service_account_json_path,
+        )
 
-        if self.google_service_account_json_path:
-            path = Path(self.google_service_account_json_path)
-            if not path.exists():
-                raise FileNotFoundError(f"Service account file not found: {path}")
-            return json.loads(path.read_text())
 
-        raise ValueError("No Google credentials configured")
+@lru_cache
+def _load_google_credentials(json_b64: str, json_path: str) -> dict:
+    """Decode service account credentials once per distinct source."""
+    if json_b64:
+        return json.loads(base64.b64decode(json_b64))
+
+    if json_path:
+        path = Path(json_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Service account file not found: {path}")
+        return json.loads(path.read_text())
+
+    raise ValueError("No Google credentials configured")
 
 
 @lru_cache
@@ -5,8 +5,10 @@ Reads from the shared SQLite database used by Shop Bot.
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+from collections.abc import AsyncIterator
 from pathlib import Path
 
 import aiosqlite
@@ -22,11 +24,45 @@ OPENAI_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
 _DATA_DIR = Path(__file__).parent.parent.parent / "data"
 DB_PATH = "/app/data/bot.sqlite3" if os.path.exists("/app/data") else str(_DATA_DIR / "bot.sqlite3")
 
+# Shared long-lived connection (see _get_db); closed by close_db() on shutdown
+_db: aiosqlite.Connection | None = None
+_db_lock = asyncio.Lock()
+
+
+async def _get_db() -> aiosqlite.Connection:
+    """Return the shared read connection, opening it on first use."""
+    global _db
+    if _db is not None:
+        return _db
+    async with _db_lock:
+        if _db is None:
+            conn = aiosqlite.connect(DB_PATH)
+            # Worker thread must not block interpreter exit if close_db() is skipped
+            conn.daemon = True
+            await conn
+            conn.row_factory = aiosqlite.Row
+            # Read-only use: Shop Bot owns journal_mode (WAL, persistent in the file)
+            await conn.execute("PRAGMA temp_store=MEMORY")
+            await conn.execute("PRAGMA mmap_size=268435456")
+            # 64 MB page cache; it persists across queries on this connection
+            await conn.execute("PRAGMA cache_size=-65536")
+            _db = conn
+    return _db
+
+
+async def close_db() -> None:
+    """Close the shared connection, if open."""
+    global _db
+    conn, _db = _db, None
+    if conn is not None:
+        await conn.close()
+
 
 async def get_user_messages(
     user_id: int,
     limit: int = 50,
     direction: str | None = None,
+    max_text_len: int | None = None,
 ) -> list[dict]:
     """Get CRM messages for a user.
 
@@ -34,37 +70,40 @@ async def get_user_messages(
         user_id: Telegram user ID
         limit: Maximum number of messages to return
         direction: Filter by direction ('in' or 'out'), or None for all
+        max_text_len: Truncate text to this many characters in SQL, or None for full text
 
     Returns:
         List of message dicts with keys: id, direction, message_type, text, created_at
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            if direction:
-                cur = await db.execute(
-                    """
-                    SELECT id, direction, message_type, text, created_at
-                    FROM crm_messages
-                    WHERE user_id = ? AND direction = ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                    """,
-                    (user_id, direction, limit),
-                )
-            else:
-                cur = await db.execute(
-                    """
-                    SELECT id, direction, message_type, text, created_at
-                    FROM crm_messages
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                    """,
-                    (user_id, limit),
-                )
-            rows = await cur.fetchall()
-            return [dict(row) for row in rows]
+        db = await _get_db()
+        # substr(text, 1, NULL) is NULL, so max_text_len=None keeps the full text
+        if direction:
+            cur = await db.execute(
+                """
+                SELECT id, direction, message_type,
+                       COALESCE(substr(text, 1, ?), text) AS text, created_at
+                FROM crm_messages
+                WHERE user_id = ? AND direction = ?
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (max_text_len, user_id, direction, limit),
+            )
+        else:
+            cur = await db.execute(
+                """
+                SELECT id, direction, message_type,
+                       COALESCE(substr(text, 1, ?), text) AS text, created_at
+                FROM crm_messages
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (max_text_len, user_id, limit),
+            )
+        rows = await cur.fetchall()
+        return [dict(row) for row in rows]
     except Exception as e:
         logger.error("user_messages_fetch_failed", extra={"user_id": user_id, "error": str(e)})
         return []
@@ -73,13 +112,13 @@ async def get_user_messages(
 async def get_user_messages_count(user_id: int) -> int:
     """Get total count of messages for a user."""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cur = await db.execute(
-                "SELECT COUNT(*) FROM crm_messages WHERE user_id = ?",
-                (user_id,),
-            )
-            row = await cur.fetchone()
-            return row[0] if row else 0
+        db = await _get_db()
+        cur = await db.execute(
+            "SELECT COUNT(*) FROM crm_messages WHERE user_id = ?",
+            (user_id,),
+        )
+        row = await cur.fetchone()
+        return row[0] if row else 0
     except Exception as e:
         logger.error("messages_count_failed", extra={"user_id": user_id, "error": str(e)})
         return 0
@@ -101,33 +140,32 @@ async def get_user_events(
         List of event dicts with keys: id, event_type, payload_json, created_at
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            if event_types:
-                placeholders = ','.join('?' * len(event_types))
-                cur = await db.execute(
-                    f"""
-                    SELECT id, event_type, payload_json, created_at
-                    FROM crm_events
-                    WHERE user_id = ? AND event_type IN ({placeholders})
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                    """,
-                    (user_id, *event_types, limit),
-                )
-            else:
-                cur = await db.execute(
-                    """
-                    SELECT id, event_type, payload_json, created_at
-                    FROM crm_events
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                    """,
-                    (user_id, limit),
-                )
-            rows = await cur.fetchall()
-            return [dict(row) for row in rows]
+        db = await _get_db()
+        if event_types:
+            placeholders = ','.join('?' * len(event_types))
+            cur = await db.execute(
+                f"""
+                SELECT id, event_type, payload_json, created_at
+                FROM crm_events
+                WHERE user_id = ? AND event_type IN ({placeholders})
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (user_id, *event_types, limit),
+            )
+        else:
+            cur = await db.execute(
+                """
+                SELECT id, event_type, payload_json, created_at
+                FROM crm_events
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (user_id, limit),
+            )
+        rows = await cur.fetchall()
+        return [dict(row) for row in rows]
     except Exception as e:
         logger.error("user_events_fetch_failed", extra={"user_id": user_id, "error": str(e)})
         return []
@@ -138,22 +176,18 @@ async def format_messages_for_display(user_id: int, limit: int = 20) -> str:
 
     Returns messages in reverse chronological order, newest first.
     """
-    messages = await get_user_messages(user_id, limit=limit)
+    # One extra character is enough to tell whether "..." is needed
+    messages = await get_user_messages(user_id, limit=limit, max_text_len=101)
 
     if not messages:
         return "Нет сообщений."
 
-    # Reverse to show oldest first (chronological order)
-    messages = list(reversed(messages))
-
-    lines = []
-    for msg in messages:
-        direction = "👤" if msg['direction'] == 'in' else "🤖"
-        text = msg['text'][:100] + "..." if len(msg['text']) > 100 else msg['text']
-        ts = msg['created_at'][:16] if msg['created_at'] else ""
-        lines.append(f"{direction} {ts}\n{text}")
-
-    return "\n\n".join(lines)
+    # Iterate in reverse to show oldest first (chronological order)
+    return "\n\n".join([
+        f"{'👤' if msg['direction'] == 'in' else '🤖'} {(msg['created_at'] or '')[:16]}\n"
+        f"{msg['text'][:100] + '...' if len(msg['text']) > 100 else msg['text']}"
+        for msg in reversed(messages)
+    ])
 
 
 SUMMARY_SYSTEM_PROMPT = """Ты — аналитик CRM для оптового магазина табачных изделий.
@@ -171,47 +205,61 @@ SUMMARY_SYSTEM_PROMPT = """Ты — аналитик CRM для оптового
 """
 
 
-async def generate_ai_summary(
+# One client per API key, so its HTTP connection pool (and TLS sessions) is reused
+_openai_clients: dict[str, AsyncOpenAI] = {}
+
+
+def _get_openai_client(api_key: str) -> AsyncOpenAI:
+    """Return the cached AsyncOpenAI client for api_key, creating it on first use."""
+    client = _openai_clients.get(api_key)
+    if client is None:
+        client = _openai_clients[api_key] = AsyncOpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT)
+    return client
+
+
+async def stream_ai_summary(
     user_id: int,
     api_key: str,
     model: str = "gpt-4o-mini",
     max_messages: int = 30,
-) -> str:
-    """Generate AI summary of user's conversation history.
+) -> AsyncIterator[str]:
+    """Stream AI summary of user's conversation history.
+
+    Yields the summary accumulated so far each time new tokens arrive, so the
+    caller can show partial text while the model is still generating. The last
+    yielded value is the complete summary (or a fallback/error message).
 
     Args:
         user_id: Telegram user ID
         api_key: OpenAI API key
         model: OpenAI model to use
         max_messages: Maximum number of messages to include
-
-    Returns:
-        AI-generated summary text
     """
-    messages = await get_user_messages(user_id, limit=max_messages)
+    messages = await get_user_messages(user_id, limit=max_messages, max_text_len=500)
 
     if not messages:
-        return "Нет сообщений для анализа."
+        yield "Нет сообщений для анализа."
+        return
 
     # Reverse to chronological order
     messages = list(reversed(messages))
 
-    # Format conversation for AI
+    # Format conversation for AI (long texts already truncated in SQL)
     conversation_lines = []
     for msg in messages:
         role = "Клиент" if msg['direction'] == 'in' else "AI-продавец"
-        text = msg['text'][:500]  # Truncate long messages
-        conversation_lines.append(f"{role}: {text}")
+        conversation_lines.append(f"{role}: {msg['text']}")
 
     conversation_text = "\n".join(conversation_lines)
 
     if len(conversation_text) < 20:
-        return "Недостаточно данных для анализа."
+        yield "Недостаточно данных для анализа."
+        return
 
     try:
-        client = AsyncOpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT)
+        client = _get_openai_client(api_key)
 
-        response = await client.chat.completions.create(
+        stream = await client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
@@ -219,10 +267,19 @@ async def generate_ai_summary(
             ],
             max_tokens=500,
             temperature=0.3,
+            stream=True,
         )
 
-        return response.choices[0].message.content or "Не удалось сгенерировать сводку."
+        summary = ""
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                summary += delta
+                yield summary
+
+        if not summary:
+            yield "Не удалось сгенерировать сводку."
 
     except Exception as e:
         logger.error("ai_summary_failed", extra={"user_id": user_id, "error": str(e)})
-        return f"Ошибка AI: {str(e)}"
+        yield f"Ошибка AI: {str(e)}"
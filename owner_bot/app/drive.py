@@ -1,6 +1,8 @@
 """Google Drive client for photo storage."""
 
+import asyncio
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import BinaryIO
 
@@ -69,14 +71,14 @@ class DriveClient:
             resumable=True,
         )
 
-        file_result = (
+        file_result = await asyncio.to_thread(
             self.service.files()
             .create(
                 body=file_metadata,
                 media_body=media,
                 fields="id,webViewLink",
             )
-            .execute()
+            .execute
         )
 
         file_id = file_result["id"]
@@ -86,11 +88,13 @@ class DriveClient:
         error_message = None
 
         try:
-            self.service.permissions().create(
-                fileId=file_id,
-                body={"type": "anyone", "role": "reader"},
-                fields="id",
-            ).execute()
+            await asyncio.to_thread(
+                self.service.permissions().create(
+                    fileId=file_id,
+                    body={"type": "anyone", "role": "reader"},
+                    fields="id",
+                ).execute
+            )
         except Exception as e:
             permissions_ok = False
             error_message = str(e)
@@ -121,14 +125,14 @@ class DriveClient:
             resumable=True,
         )
 
-        file_result = (
+        file_result = await asyncio.to_thread(
             self.service.files()
             .create(
                 body=file_metadata,
                 media_body=media,
                 fields="id,webViewLink",
             )
-            .execute()
+            .execute
         )
 
         file_id = file_result["id"]
@@ -138,11 +142,13 @@ class DriveClient:
         error_message = None
 
         try:
-            self.service.permissions().create(
-                fileId=file_id,
-                body={"type": "anyone", "role": "reader"},
-                fields="id",
-            ).execute()
+            await asyncio.to_thread(
+                self.service.permissions().create(
+                    fileId=file_id,
+                    body={"type": "anyone", "role": "reader"},
+                    fields="id",
+                ).execute
+            )
         except Exception as e:
             permissions_ok = False
             error_message = str(e)
@@ -157,7 +163,7 @@ class DriveClient:
     async def delete_photo(self, file_id: str) -> bool:
         """Delete a photo from Drive."""
         try:
-            self.service.files().delete(fileId=file_id).execute()
+            await asyncio.to_thread(self.service.files().delete(fileId=file_id).execute)
             return True
         except Exception as e:
             logger.error("photo_delete_failed", extra={"file_id": file_id, "error": str(e)})
@@ -169,7 +175,7 @@ class DriveClient:
         """List files in the configured folder."""
         settings = get_settings()
 
-        result = (
+        result = await asyncio.to_thread(
             self.service.files()
             .list(
                 q=f"'{settings.drive_folder_id}' in parents and trashed = false",
@@ -177,7 +183,7 @@ class DriveClient:
                 fields="files(id, name, createdTime, size)",
                 orderBy="createdTime desc",
             )
-            .execute()
+            .execute
         )
 
         return result.get("files", [])
@@ -191,10 +197,10 @@ class DriveClient:
             files = await self.list_folder(limit=1)
 
             # Try to get folder info
-            folder_info = (
+            folder_info = await asyncio.to_thread(
                 self.service.files()
                 .get(fileId=settings.drive_folder_id, fields="id,name")
-                .execute()
+                .execute
             )
 
             return {
@@ -211,5 +217,7 @@ class DriveClient:
             }
 
 
-# Global client instance
-drive_client = DriveClient()
+@lru_cache
+def get_drive_client() -> DriveClient:
+    """Get the shared Drive client instance."""
+    return DriveClient()
@@ -1,6 +1,8 @@
 """CRM handlers for Owner Bot."""
 
+import contextlib
 import logging
+import time
 from datetime import datetime
 from typing import Any
 
@@ -14,8 +16,8 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from app.config import get_settings
 from app.crm_db import (
     format_messages_for_display,
-    generate_ai_summary,
     get_user_messages_count,
+    stream_ai_summary,
 )
 from app.keyboards import main_menu_keyboard
 from app.sheets import sheets_client
@@ -23,6 +25,13 @@ from app.sheets import sheets_client
 logger = logging.getLogger(__name__)
 
 router = Router()
+# Every callback in this module is "crm:*"; other callbacks are rejected with
+# one prefix check instead of being tested against each handler's filter
+router.callback_query.filter(F.data.startswith("crm:"))
+
+# Minimum seconds between progressive edits while an AI summary streams in
+# (Telegram rate-limits frequent edits of the same message)
+SUMMARY_EDIT_INTERVAL = 1.5
 
 
 async def _safe_edit_text(
@@ -424,30 +433,40 @@ async def crm_ai_summary(cb: CallbackQuery) -> None:
 
     await cb.answer("Генерация AI-сводки...")
 
-    # Generate summary
-    summary = await generate_ai_summary(
+    reply_markup = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"crm:summary:{user_id}")],
+            [InlineKeyboardButton(text="📜 История", callback_data=f"crm:history:{user_id}")],
+            [InlineKeyboardButton(text="👤 К карточке", callback_data=f"crm:lead:{user_id}")],
+            [InlineKeyboardButton(text="🔙 CRM меню", callback_data="crm:menu")],
+        ]
+    )
+
+    # Stream summary, showing partial text unparsed since half-generated
+    # Markdown may not be valid
+    summary = ""
+    last_edit = time.monotonic()
+    async for summary in stream_ai_summary(
         user_id=user_id,
         api_key=settings.openai_api_key,
         model=settings.openai_model,
-    )
+    ):
+        now = time.monotonic()
+        if now - last_edit >= SUMMARY_EDIT_INTERVAL:
+            last_edit = now
+            with contextlib.suppress(TelegramBadRequest):
+                await cb.message.edit_text(
+                    f"🧠 AI-сводка клиента #{user_id}\n\n{summary} …",
+                    reply_markup=reply_markup,
+                    parse_mode=None,
+                )
 
     text = (
         f"🧠 *AI-сводка клиента #{user_id}*\n\n"
         f"{summary}"
     )
 
-    await _safe_edit_text(
-        cb,
-        text,
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[
-                [InlineKeyboardButton(text="🔄 Обновить", callback_data=f"crm:summary:{user_id}")],
-                [InlineKeyboardButton(text="📜 История", callback_data=f"crm:history:{user_id}")],
-                [InlineKeyboardButton(text="👤 К карточке", callback_data=f"crm:lead:{user_id}")],
-                [InlineKeyboardButton(text="🔙 CRM меню", callback_data="crm:menu")],
-            ]
-        ),
-    )
+    await _safe_edit_text(cb, text, reply_markup=reply_markup)
 
 
 @router.callback_query(F.data == "crm:search")
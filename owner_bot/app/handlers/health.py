@@ -3,7 +3,7 @@
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message
 
-from app.drive import drive_client
+from app.drive import get_drive_client
 from app.keyboards import main_menu_keyboard
 from app.photo_enhance import cleanup_tmp_files
 from app.security import confirm_store
@@ -19,7 +19,7 @@ async def show_status(message: Message) -> None:
 
     # Run checks in parallel-ish manner
     sheets_status = await sheets_client.test_connection()
-    drive_status = await drive_client.test_connection()
+    drive_status = await get_drive_client().test_connection()
 
     lines = ["🔧 Статус системы\n"]
 
@@ -96,7 +96,7 @@ async def confirm_cleanup(callback: CallbackQuery) -> None:
 async def health_check(message: Message) -> None:
     """Simple health check for monitoring."""
     sheets_ok = (await sheets_client.test_connection()).get("ok", False)
-    drive_ok = (await drive_client.test_connection()).get("ok", False)
+    drive_ok = (await get_drive_client().test_connection()).get("ok", False)
 
     if sheets_ok and drive_ok:
         await message.answer("✅ OK")
@@ -11,6 +11,7 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from app import crm_db
 from app.config import get_settings
 from app.handlers import get_main_router
 from app.security import WhitelistMiddleware
@@ -77,6 +78,9 @@ async def on_shutdown(bot: Bot) -> None:
     logger = logging.getLogger(__name__)
     logger.info("Bot shutting down...")
 
+    # Close shared CRM database connection
+    await crm_db.close_db()
+
     # Close bot session
     await bot.session.close()
 
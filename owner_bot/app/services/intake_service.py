@@ -5,7 +5,7 @@ import secrets
 from dataclasses import dataclass
 from datetime import datetime
 
-from app.cloudinary_client import cloudinary_client
+from app.cloudinary_client import get_cloudinary_client
 from app.intake_parser import parse_intake_string
 from app.models import (
     DriveUploadResult,
@@ -131,7 +131,7 @@ class IntakeService:
         sku_part = session.sku or "new"
         filename = f"{sku_part}_{timestamp}.jpg"
 
-        result = await cloudinary_client.upload_photo(file_path, filename)
+        result = await get_cloudinary_client().upload_photo(file_path, filename)
 
         session.drive_file_id = result.file_id
         session.drive_url = result.public_url
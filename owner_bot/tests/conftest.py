@@ -115,7 +115,7 @@ def mock_drive_client(monkeypatch):
     mock.delete_photo = AsyncMock(return_value=True)
     mock.test_connection = AsyncMock(return_value={"ok": True})
 
-    monkeypatch.setattr("app.drive.drive_client", mock)
+    monkeypatch.setattr("app.handlers.health.get_drive_client", lambda: mock)
     return mock
 
 
@@ -0,0 +1,44 @@
+"""Tests for Cloudinary client."""
+
+import threading
+from unittest.mock import patch
+
+from app.cloudinary_client import CloudinaryClient
+
+
+class TestCloudinaryClientThreading:
+    """Blocking Cloudinary SDK calls must not run on the event loop thread."""
+
+    async def test_upload_photo_runs_off_event_loop(self, mock_settings, monkeypatch):
+        """Test that upload_photo runs the SDK upload in a worker thread."""
+        loop_thread = threading.get_ident()
+        executed_in = []
+
+        def fake_upload(file_path, **kwargs):
+            executed_in.append(threading.get_ident())
+            return {"public_id": f"{kwargs['folder']}/{kwargs['public_id']}", "secure_url": "https://x"}
+
+        monkeypatch.setattr("app.cloudinary_client.get_settings", lambda: mock_settings)
+        client = CloudinaryClient()
+        client._configured = True
+
+        with patch("app.cloudinary_client.cloudinary.uploader.upload", side_effect=fake_upload):
+            result = await client.upload_photo("/tmp/photo.jpg", "PRD-1.jpg")
+
+        assert result.public_url == "https://x"
+        assert result.file_id == "mahorka_products/PRD-1"
+        assert executed_in and executed_in[0] != loop_thread
+
+
+class TestCloudinaryClientInit:
+    """Tests for Cloudinary client configuration."""
+
+    def test_unconfigured_client_skips_global_config(self, mock_settings, monkeypatch):
+        """Test that missing credentials leave the global Cloudinary config untouched."""
+        monkeypatch.setattr("app.cloudinary_client.get_settings", lambda: mock_settings)
+
+        with patch("app.cloudinary_client.cloudinary.config") as config:
+            client = CloudinaryClient()
+
+        assert client._configured is False
+        config.assert_not_called()
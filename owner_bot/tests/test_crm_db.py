@@ -0,0 +1,76 @@
+"""Tests for CRM database helpers."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app import crm_db
+
+MESSAGES = [
+    {"direction": "out", "text": "Могу предложить табак Вирджиния."},
+    {"direction": "in", "text": "Здравствуйте, нужен табак для самокруток."},
+]
+
+
+def _chunk(content):
+    """Build a streamed completion chunk carrying one delta."""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture
+def openai_client():
+    """Mock OpenAI client and the stored conversation."""
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock()
+    with (
+        patch.object(crm_db, "get_user_messages", AsyncMock(return_value=MESSAGES)),
+        patch.object(crm_db, "_get_openai_client", return_value=client),
+    ):
+        yield client
+
+
+async def _collect(user_id: int = 1) -> list[str]:
+    return [part async for part in crm_db.stream_ai_summary(user_id, "test-key")]
+
+
+class TestStreamAiSummary:
+    """Tests for stream_ai_summary()."""
+
+    async def test_yields_accumulated_text(self, openai_client):
+        """Test each yield carries the summary so far, skipping empty deltas."""
+        openai_client.chat.completions.create.return_value = _stream(
+            _chunk("**Интерес:**"),
+            _chunk(None),
+            _chunk(" табак"),
+            SimpleNamespace(choices=[]),
+        )
+
+        assert await _collect() == ["**Интерес:**", "**Интерес:** табак"]
+        assert openai_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+    async def test_empty_stream_falls_back(self, openai_client):
+        """Test a stream without content yields the fallback message."""
+        openai_client.chat.completions.create.return_value = _stream(_chunk(None))
+
+        assert await _collect() == ["Не удалось сгенерировать сводку."]
+
+    async def test_api_error_yields_error_message(self, openai_client):
+        """Test an OpenAI failure is reported as the final value."""
+        openai_client.chat.completions.create.side_effect = RuntimeError("rate limited")
+
+        assert await _collect() == ["Ошибка AI: rate limited"]
+
+    async def test_no_messages(self):
+        """Test users without history get a message without calling OpenAI."""
+        with (
+            patch.object(crm_db, "get_user_messages", AsyncMock(return_value=[])),
+            patch.object(crm_db, "_get_openai_client") as get_client,
+        ):
+            assert await _collect() == ["Нет сообщений для анализа."]
+        get_client.assert_not_called()
@@ -0,0 +1,25 @@
+"""Tests for Google Drive client."""
+
+import threading
+from unittest.mock import MagicMock
+
+from app.drive import DriveClient
+
+
+class TestDriveClientThreading:
+    """Blocking googleapiclient calls must not run on the event loop thread."""
+
+    async def test_delete_photo_executes_off_event_loop(self):
+        """Test that delete_photo runs the request in a worker thread."""
+        loop_thread = threading.get_ident()
+        executed_in = []
+
+        client = DriveClient()
+        client._service = MagicMock()
+        client._service.files.return_value.delete.return_value.execute.side_effect = (
+            lambda: executed_in.append(threading.get_ident())
+        )
+
+        assert await client.delete_photo("file123") is True
+        client._service.files.return_value.delete.assert_called_once_with(fileId="file123")
+        assert executed_in and executed_in[0] != loop_thread
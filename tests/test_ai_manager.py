@@ -102,19 +102,19 @@ class TestRunAi:
     def sample_tool_impl(self):
         """Sample tool implementations."""
 
-        async def search_products(args):
+        async def search_products(ctx, args):
             return {"products": [{"sku": "PRD-001", "name": "Test Product"}]}
 
-        async def add_to_cart(args):
+        async def add_to_cart(ctx, args):
             return {"success": True, "message": "Added to cart"}
 
-        async def show_cart(args):
+        async def show_cart(ctx, args):
             return {"items": [], "total": 0}
 
-        async def checkout_hint(args):
+        async def checkout_hint(ctx, args):
             return {"hint": "Please provide your phone number"}
 
-        async def list_all_products(args):
+        async def list_all_products(ctx, args):
             return {"products": [{"sku": "PRD-001", "name": "Test", "price": 100}]}
 
         return {
@@ -542,6 +542,48 @@ class TestRunAi:
 
         assert result["text"] == "Your cart is empty"
 
+    @pytest.mark.asyncio
+    async def test_tool_ctx_passed_to_tools(self, mock_openai_client):
+        """Test that tool_ctx is forwarded as the first tool argument."""
+        from app.ai_manager import run_ai
+
+        mock_tool_call = MagicMock()
+        mock_tool_call.id = "call_ctx"
+        mock_tool_call.function.name = "show_cart"
+        mock_tool_call.function.arguments = "{}"
+
+        mock_message1 = MagicMock()
+        mock_message1.tool_calls = [mock_tool_call]
+        mock_message1.content = None
+
+        mock_message2 = MagicMock()
+        mock_message2.tool_calls = None
+        mock_message2.content = "Done"
+
+        mock_openai_client.chat.completions.create = AsyncMock(
+            side_effect=[
+                MagicMock(choices=[MagicMock(message=mock_message1)]),
+                MagicMock(choices=[MagicMock(message=mock_message2)]),
+            ]
+        )
+
+        seen = []
+
+        async def show_cart(ctx, args):
+            seen.append((ctx, args))
+            return {"items": []}
+
+        ctx = object()
+        await run_ai(
+            api_key="test-key",
+            model="gpt-4",
+            user_text="Show cart",
+            tool_impl={"show_cart": show_cart},
+            tool_ctx=ctx,
+        )
+
+        assert seen == [(ctx, {})]
+
 
 class TestOpenAITimeout:
     """Tests for OPENAI_TIMEOUT constant."""
@@ -45,6 +45,25 @@ async def test_init_db(isolate_test_database):
     assert "chat_history" in tables
 
 
+@pytest.mark.asyncio
+async def test_shared_connection_reused(isolate_test_database, tmp_path):
+    """Test storage calls share one WAL connection per database path."""
+    from app.storage import db
+
+    await db.init_db()
+    conn = await db.get_db(isolate_test_database)
+    assert await db.get_db(isolate_test_database) is conn
+    rows = await conn.execute_fetchall("PRAGMA journal_mode")
+    assert rows[0][0] == "wal"
+
+    # Switching path (tests patch DB_PATH) replaces the shared connection
+    other = await db.get_db(str(tmp_path / "other.sqlite3"))
+    assert other is not conn
+    await db.close_db()
+    assert await db.get_db(isolate_test_database) is not conn
+    await db.close_db()
+
+
 @pytest.mark.asyncio
 async def test_add_to_cart(monkeypatch, tmp_path):
     """Test adding items to cart."""
@@ -60,12 +79,12 @@ async def test_add_to_cart(monkeypatch, tmp_path):
     # Add item
     await cart_store.add_to_cart(user_id, sku, 5)
     cart = await cart_store.get_cart(user_id)
-    assert cart == [(sku, 5)]
+    assert cart == {sku: 5}
 
     # Add more of same item
     await cart_store.add_to_cart(user_id, sku, 3)
     cart = await cart_store.get_cart(user_id)
-    assert cart == [(sku, 8)]
+    assert cart == {sku: 8}
 
 
 @pytest.mark.asyncio
@@ -86,12 +105,12 @@ async def test_add_to_cart_negative(monkeypatch, tmp_path):
     # Decrement
     await cart_store.add_to_cart(user_id, sku, -2)
     cart = await cart_store.get_cart(user_id)
-    assert cart == [(sku, 3)]
+    assert cart == {sku: 3}
 
     # Decrement to zero - should remove
     await cart_store.add_to_cart(user_id, sku, -5)
     cart = await cart_store.get_cart(user_id)
-    assert cart == []
+    assert cart == {}
 
 
 @pytest.mark.asyncio
@@ -110,7 +129,7 @@ async def test_remove_from_cart(monkeypatch, tmp_path):
 
     await cart_store.remove_from_cart(user_id, "PRD-001")
     cart = await cart_store.get_cart(user_id)
-    assert cart == [("PRD-002", 3)]
+    assert cart == {"PRD-002": 3}
 
 
 @pytest.mark.asyncio
@@ -129,7 +148,7 @@ async def test_clear_cart(monkeypatch, tmp_path):
 
     await cart_store.clear_cart(user_id)
     cart = await cart_store.get_cart(user_id)
-    assert cart == []
+    assert cart == {}
 
 
 @pytest.mark.asyncio
@@ -147,17 +166,17 @@ async def test_set_qty(monkeypatch, tmp_path):
     # Set initial qty
     await cart_store.set_qty(user_id, sku, 10)
     cart = await cart_store.get_cart(user_id)
-    assert cart == [(sku, 10)]
+    assert cart == {sku: 10}
 
     # Change qty
     await cart_store.set_qty(user_id, sku, 5)
     cart = await cart_store.get_cart(user_id)
-    assert cart == [(sku, 5)]
+    assert cart == {sku: 5}
 
     # Set to zero - should remove
     await cart_store.set_qty(user_id, sku, 0)
     cart = await cart_store.get_cart(user_id)
-    assert cart == []
+    assert cart == {}
 
 
 @pytest.mark.asyncio
@@ -183,6 +202,26 @@ async def test_ai_mode(monkeypatch, tmp_path):
     assert await cart_store.get_ai_mode(user_id) == False
 
 
+@pytest.mark.asyncio
+async def test_ai_mode_cache_evicts_least_recently_used(monkeypatch, isolate_test_database):
+    """Test the AI mode cache stays capped and drops the least recently used user."""
+    from app.storage import chat_history
+    from app.storage.db import init_db
+
+    await init_db()
+    monkeypatch.setattr(chat_history, "AI_MODE_CACHE_MAXSIZE", 2)
+    monkeypatch.setattr(chat_history, "_ai_mode_cache", chat_history.OrderedDict())
+
+    await chat_history.set_ai_mode(1, True)
+    await chat_history.set_ai_mode(2, True)
+    assert await chat_history.get_ai_mode(1) is True  # 1 is now most recent
+    await chat_history.set_ai_mode(3, False)
+
+    assert [uid for _, uid in chat_history._ai_mode_cache] == [1, 3]
+    # Evicted users are still answered from SQLite
+    assert await chat_history.get_ai_mode(2) is True
+
+
 @pytest.mark.asyncio
 async def test_chat_history(monkeypatch, tmp_path):
     """Test chat history management."""
@@ -230,6 +269,21 @@ async def test_chat_history_limit(monkeypatch, isolate_test_database):
     assert history[-1]["content"] == "Message 9"
 
 
+@pytest.mark.asyncio
+async def test_chat_history_explicit_limit(isolate_test_database):
+    """Test get_chat_history returns only the newest `limit` messages in order."""
+    from app import cart_store
+
+    await cart_store.init_db()
+
+    user_id = 123
+    for i in range(6):
+        await cart_store.add_chat_message(user_id, "user", f"Message {i}")
+
+    history = await cart_store.get_chat_history(user_id, limit=3)
+    assert [h["content"] for h in history] == ["Message 3", "Message 4", "Message 5"]
+
+
 @pytest.mark.asyncio
 async def test_multiple_users(monkeypatch, tmp_path):
     """Test cart isolation between users."""
@@ -248,5 +302,5 @@ async def test_multiple_users(monkeypatch, tmp_path):
     cart1 = await cart_store.get_cart(user1)
     cart2 = await cart_store.get_cart(user2)
 
-    assert cart1 == [("PRD-001", 5)]
-    assert cart2 == [("PRD-002", 3)]
+    assert cart1 == {"PRD-001": 5}
+    assert cart2 == {"PRD-002": 3}
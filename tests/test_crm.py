@@ -148,6 +148,25 @@ async def test_get_user_orders_count(monkeypatch, tmp_path):
     assert count == 2
 
 
+@pytest.mark.asyncio
+async def test_get_user_order_totals(isolate_test_database):
+    """Test order count and lifetime value aggregated in one query."""
+    from app import cart_store
+
+    await cart_store.init_db()
+
+    user_id = 123456
+    assert await cart_store.get_user_order_totals(user_id) == (0, 0)
+
+    await cart_store.log_crm_event(user_id, "order_created", {"order_id": "ORD-001", "total": 5000})
+    await cart_store.log_crm_event(user_id, "order_created", {"order_id": "ORD-002", "total": 2500.5})
+    await cart_store.log_crm_event(user_id, "order_created", {"order_id": "ORD-003"})
+    await cart_store.log_crm_event(user_id, "add_to_cart", {"sku": "SKU-1", "total": 999})
+    await cart_store.log_crm_event(999, "order_created", {"order_id": "ORD-004", "total": 100})
+
+    assert await cart_store.get_user_order_totals(user_id) == (3, 7500.5)
+
+
 @pytest.mark.asyncio
 async def test_get_daily_stats(monkeypatch, tmp_path):
     """Test daily statistics calculation."""
@@ -184,6 +203,49 @@ async def test_get_daily_stats(monkeypatch, tmp_path):
     assert stats["orders_total"] == 5000
 
 
+@pytest.mark.asyncio
+async def test_get_daily_stats_only_counts_target_day(isolate_test_database):
+    """Test neighbouring days are excluded and malformed payloads add no total."""
+    from app import cart_store
+
+    await cart_store.init_db()
+
+    async with aiosqlite.connect(isolate_test_database) as db:
+        await db.executemany(
+            "INSERT INTO crm_events(user_id, event_type, payload_json, created_at) VALUES(?, ?, ?, ?)",
+            [
+                (1, "start", None, "2024-03-09 23:59:59"),
+                (2, "start", None, "2024-03-10 00:00:00"),
+                (2, "order_created", '{"total": 700}', "2024-03-10 23:59:59"),
+                (4, "order_created", "not json", "2024-03-10 12:00:00"),
+                (3, "start", None, "2024-03-11 00:00:00"),
+            ],
+        )
+        await db.commit()
+
+    stats = await cart_store.get_daily_stats(date(2024, 3, 10))
+
+    assert stats["visitors"] == 1
+    assert stats["orders"] == 2
+    assert stats["orders_total"] == 700
+
+
+@pytest.mark.asyncio
+async def test_get_daily_stats_malformed_date_returns_zeros(isolate_test_database):
+    """Test a date that is not YYYY-MM-DD yields zero stats instead of raising."""
+    from app import cart_store
+
+    await cart_store.init_db()
+    await cart_store.log_crm_event(1, "start", None)
+
+    stats = await cart_store.get_daily_stats("10.03.2024")
+
+    assert stats["date"] == "10.03.2024"
+    assert stats["visitors"] == 0
+    assert stats["orders"] == 0
+    assert stats["orders_total"] == 0
+
+
 @pytest.mark.asyncio
 async def test_get_first_last_seen(monkeypatch, tmp_path):
     """Test first_seen and last_seen timestamps."""
@@ -490,6 +552,23 @@ async def test_get_user_messages_count(monkeypatch, tmp_path):
     assert count == 3
 
 
+@pytest.mark.asyncio
+async def test_crm_messages_trimmed_per_user(monkeypatch, isolate_test_database):
+    """Test only the newest MAX_CRM_MESSAGES are kept, per user."""
+    from app import cart_store
+
+    monkeypatch.setattr("app.storage.crm.MAX_CRM_MESSAGES", 3)
+    await cart_store.init_db()
+
+    await cart_store.log_crm_message(2, "in", "Other user")
+    for i in range(5):
+        await cart_store.log_crm_message(1, "in", f"Msg {i}")
+
+    messages = await cart_store.get_user_messages(1)
+    assert [m["text"] for m in messages] == ["Msg 2", "Msg 3", "Msg 4"]
+    assert await cart_store.get_user_messages_count(2) == 1
+
+
 @pytest.mark.asyncio
 async def test_has_user_consent(monkeypatch, tmp_path):
     """Test checking user consent."""
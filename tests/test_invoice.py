@@ -277,6 +277,26 @@ class TestGenerateInvoicePdf:
 
         assert os.path.exists(pdf_path)
 
+    def test_writes_to_file_object(self, sample_seller, sample_items):
+        """Test that a binary file object can be used as output target."""
+        import io
+
+        from app.invoice import generate_invoice_pdf
+
+        buf = io.BytesIO()
+        with patch("app.invoice.ensure_font", return_value="Helvetica"):
+            generate_invoice_pdf(
+                buf,
+                invoice_no="INV-2024-BUF",
+                invoice_date="27.01.2024",
+                seller=sample_seller,
+                buyer_phone="+7 (900) 111-22-33",
+                delivery="Самовывоз",
+                items=sample_items,
+            )
+
+        assert buf.getvalue().startswith(b"%PDF")
+
 
 class TestInvoiceIntegration:
     """Integration tests for invoice generation."""
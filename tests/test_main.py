@@ -0,0 +1,31 @@
+"""Tests for bot entry point helpers."""
+
+import pytest
+from aiohttp import TCPConnector
+
+
+@pytest.mark.asyncio
+async def test_bot_session_connector_settings(monkeypatch):
+    """Test the Bot API session builds its connector with DNS caching and keep-alive."""
+    from aiogram.client.session import aiohttp as aiogram_aiohttp
+
+    from app.main import create_bot_session
+
+    connector_kwargs = {}
+
+    class RecordingConnector(TCPConnector):
+        def __init__(self, **kwargs):
+            connector_kwargs.update(kwargs)
+            super().__init__(**kwargs)
+
+    monkeypatch.setattr(aiogram_aiohttp, "TCPConnector", RecordingConnector)
+
+    session = create_bot_session()
+    try:
+        client_session = await session.create_session()
+        assert isinstance(client_session.connector, RecordingConnector)
+    finally:
+        await session.close()
+
+    assert connector_kwargs["ttl_dns_cache"] == 300
+    assert connector_kwargs["keepalive_timeout"] == 60
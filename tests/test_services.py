@@ -22,13 +22,13 @@ class MockSheetsClient:
         self._products = products or []
         self._settings = settings or {}
 
-    def get_products(self):
+    def get_products(self, force_refresh=False):
         return self._products
 
     def get_settings(self):
         return self._settings
 
-    def get_categories(self):
+    def get_categories(self, force_refresh=False):
         tags_set = set()
         for p in self._products:
             tags = p.get("tags", "")
@@ -143,6 +143,35 @@ class TestProductService:
         # Non-existent SKU
         assert service.get_product("NON-EXISTENT") is None
 
+    def test_get_products_by_sku_reuses_index(self, sample_products):
+        """Test SKU index is built once per cache refresh."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        by_sku = service.get_products_by_sku()
+        assert set(by_sku) == {"PRD-001", "PRD-002", "PRD-003"}
+        assert service.get_products_by_sku() is by_sku
+
+        mock_sheets._products = sample_products[:1]
+        service.invalidate_cache()
+        assert set(service.get_products_by_sku()) == {"PRD-001"}
+
+    def test_get_cart_products(self, sample_products):
+        """Test cart views carry pre-rendered fields and do not touch product dicts."""
+        from app.services.product_service import CartProduct, ProductService
+
+        sample_products[0]["name"] = "Махорка <Золотая>"
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        view = service.get_cart_products()["PRD-001"]
+        assert view == CartProduct(
+            "Махорка <Золотая>", 1000, 100, "Махорка &lt;Золотая&gt;", "1,000"
+        )
+        assert set(service.get_product("PRD-001")) == set(sample_products[1])
+
     def test_get_min_order_sum(self, sample_products, sample_settings):
         """Test getting minimum order sum."""
         from app.services.product_service import ProductService
@@ -168,6 +197,61 @@ class TestProductService:
         all_products = service.filter_by_category("all")
         assert len(all_products) == 2
 
+    def test_filter_by_category_substring_fallback(self, sample_products):
+        """Test categories that are not exact tags still match by substring."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        assert [p["sku"] for p in service.filter_by_category("Табак")] == ["PRD-001", "PRD-002"]
+        assert [p["sku"] for p in service.filter_by_category("класс")] == ["PRD-002"]
+        # Out-of-stock products are never indexed
+        assert service.filter_by_category("аксессуары") == []
+
+    def test_filter_by_category_includes_compound_tags(self, sample_products):
+        """Test an exact tag also matches products whose tags merely contain it."""
+        from app.services.product_service import ProductService
+
+        sample_products[1]["tags"] = "табак трубочный,классика"
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        assert [p["sku"] for p in service.filter_by_category("табак")] == ["PRD-001", "PRD-002"]
+        assert [p["sku"] for p in service.filter_by_category("табак трубочный")] == ["PRD-002"]
+
+    def test_refresh_bypasses_sheets_products_cache(self, sample_products):
+        """Test refreshes force SheetsClient past its own products TTL."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        mock_sheets.get_products = MagicMock(return_value=sample_products)
+        mock_sheets.get_categories = MagicMock(return_value=["табак"])
+        service = ProductService(mock_sheets)
+
+        service.get_products()
+        service.get_categories()
+
+        mock_sheets.get_products.assert_called_once_with(force_refresh=True)
+        mock_sheets.get_categories.assert_called_once_with(force_refresh=True)
+
+    def test_derived_getters_follow_refresh(self, sample_products, sample_settings):
+        """Test memoized category filter and min sum are dropped on refresh."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products, settings=sample_settings)
+        service = ProductService(mock_sheets)
+
+        assert service.filter_by_category("премиум") is service.filter_by_category("премиум")
+        assert service.get_min_order_sum() == 5000
+
+        mock_sheets._products = sample_products[1:]
+        mock_sheets._settings = {"Мин. сумма заказа": "7000"}
+        service.invalidate_cache()
+
+        assert service.filter_by_category("премиум") == []
+        assert service.get_min_order_sum() == 7000
+
     def test_search(self, sample_products):
         """Test product search."""
         from app.services.product_service import ProductService
@@ -193,6 +277,95 @@ class TestProductService:
         results = service.search("")
         assert len(results) == 0
 
+    def test_search_matches_each_product_once(self, sample_products):
+        """Test search returns each matching product once, in catalog order."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        # "махорка" appears in name of two products (and nowhere across boundaries)
+        results = service.search("Махорка")
+        assert [p["sku"] for p in results] == ["PRD-001", "PRD-002"]
+
+        # Substring spanning the end of one product and start of the next must not match
+        assert service.search("prd-001махорка") == []
+
+    def test_invalidate_products_keeps_settings(self, sample_products, sample_settings):
+        """Test invalidate_products refetches products only and bumps version."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products, settings=sample_settings)
+        service = ProductService(mock_sheets)
+
+        service.get_products()
+        service.get_settings()
+        version = service.products_version
+
+        mock_sheets._products = []
+        mock_sheets._settings = {}
+        service.invalidate_products()
+
+        assert service.get_products() == []
+        assert service.products_version == version + 1
+        assert service.get_settings() == sample_settings
+
+    @pytest.mark.asyncio
+    async def test_expired_cache_refreshes_once_in_background(self, sample_products):
+        """Test expired TTL serves stale data while a single refresh runs."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        service.get_products()
+        service._products_cache_time -= 3600
+        mock_sheets._products = sample_products[:1]
+
+        assert len(service.get_products()) == 3
+        task = service._refresh_tasks["products"]
+        assert len(service.get_products()) == 3
+        assert service._refresh_tasks["products"] is task
+
+        await task
+        assert service.get_products() == sample_products[:1]
+        assert service.get_product("PRD-002") is None
+
+    @pytest.mark.asyncio
+    async def test_invalidate_discards_background_refresh(self, sample_products):
+        """Test a background result started before invalidation is dropped."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products)
+        service = ProductService(mock_sheets)
+
+        service.get_products()
+        service._products_cache_time -= 3600
+        service.get_products()
+        task = service._refresh_tasks["products"]
+
+        service.invalidate_products()
+        await task
+
+        mock_sheets._products = []
+        assert service.get_products() == []
+
+    @pytest.mark.asyncio
+    async def test_warm_up_loads_all_caches(self, sample_products, sample_settings):
+        """Test warm_up fills products, settings and categories in one go."""
+        from app.services.product_service import ProductService
+
+        mock_sheets = MockSheetsClient(products=sample_products, settings=sample_settings)
+        service = ProductService(mock_sheets)
+
+        await service.warm_up()
+
+        mock_sheets._products = []
+        mock_sheets._settings = {}
+        assert len(service.get_products()) == 3
+        assert service.get_min_order_sum() == 5000
+        assert service.get_categories() == ["аксессуары", "классика", "премиум", "табак"]
+
     def test_invalidate_cache(self, sample_products):
         """Test cache invalidation."""
         from app.services.product_service import ProductService
@@ -341,3 +514,57 @@ class TestCartService:
         assert "Корзина" in text
         assert "Махорка Золотая" in text
         assert "2 000" in text or "2,000" in text  # Price formatting
+
+    @pytest.mark.asyncio
+    async def test_get_cart_totals(self, sample_products, sample_settings, monkeypatch, tmp_path):
+        """Test cart totals match the rendered summary."""
+        from app import cart_store
+        from app.services.cart_service import CartService
+        from app.services.product_service import ProductService
+
+        db_path = str(tmp_path / "test.sqlite3")
+        monkeypatch.setattr(cart_store, "DB_PATH", db_path)
+        await cart_store.init_db()
+
+        mock_sheets = MockSheetsClient(products=sample_products, settings=sample_settings)
+        product_service = ProductService(mock_sheets)
+        cart_service = CartService(product_service)
+
+        user_id = 123
+
+        assert await cart_service.get_cart_totals(user_id) == (0, 5000, {})
+
+        await cart_service.add_to_cart(user_id, "PRD-001", 3)
+        await cart_service.add_to_cart(user_id, "PRD-002", 1)
+
+        total, min_sum, cart_items = await cart_service.get_cart_totals(user_id)
+        summary = await cart_service.get_cart_summary(user_id)
+        assert total == summary.total == 3500
+        assert min_sum == 5000
+        assert cart_items == {"PRD-001": 3, "PRD-002": 1}
+
+    @pytest.mark.asyncio
+    async def test_prefetched_lookups_are_used(
+        self, sample_products, sample_settings, monkeypatch, tmp_path
+    ):
+        """Test callers can pass cart products and min sum fetched once."""
+        from app import cart_store
+        from app.services.cart_service import CartService
+        from app.services.product_service import ProductService
+
+        db_path = str(tmp_path / "test.sqlite3")
+        monkeypatch.setattr(cart_store, "DB_PATH", db_path)
+        await cart_store.init_db()
+
+        mock_sheets = MockSheetsClient(products=sample_products, settings=sample_settings)
+        product_service = ProductService(mock_sheets)
+        cart_service = CartService(product_service)
+
+        user_id = 123
+        cart_products = product_service.get_cart_products()
+        success, _ = await cart_service.add_to_cart(user_id, "PRD-001", 2, cart_products)
+        assert success is True
+
+        summary = await cart_service.get_cart_summary(user_id, cart_products, min_sum=1000)
+        assert summary.total == 2000
+        assert summary.below_min is False
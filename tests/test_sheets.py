@@ -200,6 +200,45 @@ class TestRetryAsync:
         with pytest.raises(MockHttpError):
             await retry_async(not_found, retries=3, delay=0.01)
 
+    @pytest.mark.asyncio
+    async def test_http_error_honors_retry_after(self):
+        from app.sheets import retry_async
+
+        error = MockHttpError(429)
+        error.resp.get = lambda key: "2" if key == "retry-after" else None
+        calls = []
+
+        async def rate_limited():
+            calls.append(1)
+            if len(calls) < 2:
+                raise error
+            return "ok"
+
+        with patch("app.sheets.asyncio.sleep") as mock_sleep:
+            result = await retry_async(rate_limited, retries=3, delay=0.01)
+
+        assert result == "ok"
+        sleep_args = [c.args[0] for c in mock_sleep.call_args_list]
+        assert sleep_args == [2.0]
+
+    @pytest.mark.asyncio
+    async def test_backoff_jittered_and_no_sleep_after_last_attempt(self):
+        from app.sheets import retry_async
+
+        async def always_fail():
+            raise Exception("Always fails")
+
+        with (
+            patch("app.sheets.asyncio.sleep") as mock_sleep,
+            pytest.raises(Exception, match="Always fails"),
+        ):
+            await retry_async(always_fail, retries=3, delay=1.0)
+
+        waits = [c.args[0] for c in mock_sleep.call_args_list]
+        assert len(waits) == 2
+        assert 0 <= waits[0] <= 1.0
+        assert 0 <= waits[1] <= 2.0
+
     @pytest.mark.asyncio
     async def test_with_arguments(self):
         from app.sheets import retry_async
@@ -399,6 +438,86 @@ class TestSheetsClientGetProducts:
         assert len(products) == 2
         assert all(p["sku"] for p in products)
 
+    def test_get_products_missing_columns_ignore_trailing_data(self, mock_sheets_client):
+        """Test missing optional columns use defaults, not an unmatched trailing column."""
+        client, mock_service = mock_sheets_client
+
+        mock_values = [
+            ["SKU", "Наименование", "Цена", "Заметки"],
+            ["PRD-001", "Товар 1", "1000", "7"],
+            ["PRD-002", "Товар 2", "2000"],
+        ]
+
+        mock_service.spreadsheets().values().get().execute.return_value = {"values": mock_values}
+
+        products = client.get_products()
+        assert len(products) == 2
+        for product in products:
+            assert product["stock"] == 100
+            assert product["tags"] == ""
+            assert product["photo_url"] == ""
+            assert product["desc_short"] == ""
+            assert product["desc_full"] == ""
+
+    def test_get_products_cached(self, mock_sheets_client):
+        """Test repeated calls and get_categories reuse one API fetch."""
+        client, mock_service = mock_sheets_client
+
+        execute = mock_service.spreadsheets().values().get().execute
+        execute.return_value = {"values": [["SKU", "Наименование", "Теги"], ["P1", "Product", "tag"]]}
+
+        assert client.get_products() is client.get_products()
+        assert client.get_categories() == ["tag"]
+        assert client.get_categories() is client.get_categories()
+        assert execute.call_count == 1
+
+        client.invalidate_products_cache()
+        client.get_products()
+        assert execute.call_count == 2
+
+    def test_get_products_force_refresh(self, mock_sheets_client):
+        """Test force_refresh bypasses a fresh cache and stores the new result."""
+        client, mock_service = mock_sheets_client
+
+        execute = mock_service.spreadsheets().values().get().execute
+        execute.return_value = {"values": [["SKU", "Наименование", "Теги"], ["P1", "Product", "tag"]]}
+
+        client.get_products()
+        client.get_products(force_refresh=True)
+        assert client.get_categories(force_refresh=True) == ["tag"]
+        assert execute.call_count == 3
+
+        client.get_categories()
+        assert execute.call_count == 3
+
+    def test_invalidate_during_fetch_discards_result(self, mock_sheets_client):
+        """Test a fetch overlapping invalidation is not cached, and invalidation never blocks."""
+        client, mock_service = mock_sheets_client
+
+        def fetch_then_stock_write(*args, **kwargs):
+            # Runs while the fetch holds the products lock
+            client.invalidate_products_cache()
+            return {"values": [["SKU", "Наименование"], ["P1", "Product"]]}
+
+        execute = mock_service.spreadsheets().values().get().execute
+        execute.side_effect = fetch_then_stock_write
+
+        assert len(client.get_products()) == 1
+        client.get_products()
+        assert execute.call_count == 2
+
+    def test_get_products_api_error_not_cached(self, mock_sheets_client):
+        """Test a failed fetch is retried on the next call."""
+        client, mock_service = mock_sheets_client
+
+        execute = mock_service.spreadsheets().values().get().execute
+        execute.side_effect = Exception("API Error")
+        assert client.get_products() == []
+
+        execute.side_effect = None
+        execute.return_value = {"values": [["SKU", "Наименование"], ["P1", "Product"]]}
+        assert len(client.get_products()) == 1
+
 
 class TestSheetsClientGetSettings:
     """Tests for SheetsClient.get_settings() method."""
@@ -605,6 +724,43 @@ class TestSheetsClientDecreaseStock:
         # Verify batch update was called
         mock_service.spreadsheets().values().batchUpdate.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_decrease_stock_merges_adjacent_rows(self, mock_sheets_client):
+        """Test contiguous rows are written as one range."""
+        client, mock_service = mock_sheets_client
+
+        mock_values = [
+            ["SKU", "Наименование", "Списано"],
+            ["PRD-001", "Product1", "10"],
+            ["PRD-002", "Product2", "5"],
+            ["PRD-003", "Product3", ""],
+            ["PRD-004", "Product4", "1"],
+        ]
+
+        mock_service.spreadsheets().values().get().execute.return_value = {"values": mock_values}
+
+        await client.decrease_stock([("PRD-001", 3), ("PRD-002", 1), ("PRD-004", 2)])
+
+        body = mock_service.spreadsheets().values().batchUpdate.call_args.kwargs["body"]
+        assert body["data"] == [
+            {"range": "Склад!C2:C3", "values": [[13], [6]]},
+            {"range": "Склад!C5:C5", "values": [[3]]},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_decrease_stock_column_past_z(self, mock_sheets_client):
+        """Test a Списано column beyond Z gets a two-letter A1 reference."""
+        client, mock_service = mock_sheets_client
+
+        header = ["SKU"] + [f"col{i}" for i in range(26)] + ["Списано"]
+        row = ["PRD-001"] + [""] * 26 + ["4"]
+        mock_service.spreadsheets().values().get().execute.return_value = {"values": [header, row]}
+
+        await client.decrease_stock([("PRD-001", 1)])
+
+        body = mock_service.spreadsheets().values().batchUpdate.call_args.kwargs["body"]
+        assert body["data"] == [{"range": "Склад!AB2:AB2", "values": [[5]]}]
+
     @pytest.mark.asyncio
     async def test_decrease_stock_missing_columns(self, mock_sheets_client):
         """Test when required columns are missing."""
@@ -693,6 +849,36 @@ class TestSheetsClientAsyncMethods:
 
         mock_service.spreadsheets().values().append.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_bounded(self, mock_sheets_client):
+        """Test at most SHEETS_MAX_CONCURRENCY blocking calls run at once."""
+        import asyncio
+        import threading
+        import time
+
+        from app.sheets import SHEETS_MAX_CONCURRENCY
+
+        client, mock_service = mock_sheets_client
+
+        lock = threading.Lock()
+        running = peak = 0
+
+        def slow_execute():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+            return {"values": []}
+
+        mock_service.spreadsheets().values().get().execute.side_effect = slow_execute
+
+        await asyncio.gather(*(client.get_values("Sheet!A1") for _ in range(12)))
+
+        assert peak <= SHEETS_MAX_CONCURRENCY
+
 
 class TestSheetsClientSyncMethods:
     """Tests for sync methods."""
@@ -720,6 +906,8 @@ class TestSheetsClientSyncMethods:
 
         result = client.get_values_sync("Sheet!A1")
         assert result == [["test"]]
+        get_kwargs = mock_service.spreadsheets().values().get.call_args.kwargs
+        assert get_kwargs["fields"] == "values"
 
     def test_append_values_sync(self, mock_sheets_client):
         """Test sync append_values_sync method."""
@@ -803,3 +991,119 @@ class TestSheetsClientBatchUpdate:
         await client.batch_update_values(data)
 
         mock_service.spreadsheets().values().batchUpdate.assert_called_once()
+
+
+class TestSheetsClientLeadsCache:
+    """Tests for the Leads rows cache used by upsert_lead()."""
+
+    @pytest.fixture
+    def mock_sheets_client(self):
+        """Create a mocked SheetsClient."""
+        with patch("app.sheets.Credentials") as mock_creds, patch("app.sheets.build") as mock_build:
+            mock_creds.from_service_account_file.return_value = MagicMock()
+            mock_service = MagicMock()
+            mock_build.return_value = mock_service
+
+            from app.sheets import SheetsClient
+
+            with patch("pathlib.Path"):
+                client = SheetsClient("test_spreadsheet_id", "/fake/path.json")
+
+            yield client, mock_service
+
+    @pytest.mark.asyncio
+    async def test_upsert_new_then_existing_reads_once(self, mock_sheets_client):
+        """Test a created lead is updated in place without refetching Leads."""
+        client, mock_service = mock_sheets_client
+
+        execute = mock_service.spreadsheets().values().get().execute
+        execute.return_value = {"values": [["111", "old", "", "", "new"]]}
+        mock_service.spreadsheets().values().append().execute.return_value = {
+            "updates": {"updatedRange": "Leads!A3:M3"}
+        }
+
+        await client.upsert_lead(222, stage="new")
+        await client.upsert_lead(222, stage="cart")
+
+        assert execute.call_count == 1
+        assert mock_service.spreadsheets().values().append().execute.call_count == 1
+        data = mock_service.spreadsheets().values().batchUpdate.call_args.kwargs["body"]["data"]
+        # Row 2 holds user 111, Sheets reports the appended lead on row 3
+        assert [d["range"] for d in data] == ["Leads!D3:E3"]
+        assert data[0]["values"][0][1] == "cart"
+
+    @pytest.mark.asyncio
+    async def test_appends_returning_out_of_order_cache_reported_rows(self, mock_sheets_client):
+        """Test new leads are cached at the rows Sheets reports, not at a guessed row."""
+        client, mock_service = mock_sheets_client
+
+        mock_service.spreadsheets().values().get().execute.return_value = {
+            "values": [["111", "old", "", "", "new"]]
+        }
+        append_execute = mock_service.spreadsheets().values().append().execute
+        # 333 lands after 222, but its append returns first
+        append_execute.side_effect = [
+            {"updates": {"updatedRange": "Leads!A4:M4"}},
+            {"updates": {"updatedRange": "Leads!A3:M3"}},
+        ]
+
+        await client.upsert_lead(333, stage="new")
+        await client.upsert_lead(222, stage="new")
+
+        assert (await client.get_lead(222))["user_id"] == 222
+        assert (await client.get_lead(333))["user_id"] == 333
+        _, user_map = client._get_leads_data_sync()
+        assert user_map == {111: 2, 222: 3, 333: 4}
+        assert mock_service.spreadsheets().values().get().execute.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_unparsable_append_response_drops_cache(self, mock_sheets_client):
+        """Test an append without a usable updatedRange forces a refetch."""
+        client, mock_service = mock_sheets_client
+
+        get_execute = mock_service.spreadsheets().values().get().execute
+        get_execute.return_value = {"values": [["111", "old", "", "", "new"]]}
+        mock_service.spreadsheets().values().append().execute.return_value = {}
+
+        await client.upsert_lead(222, stage="new")
+        await client.get_lead(222)
+
+        assert get_execute.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_upsert_existing_writes_only_changed_cells(self, mock_sheets_client):
+        """Test an update sends last_seen_at plus the given fields, never the cached row."""
+        client, mock_service = mock_sheets_client
+
+        mock_service.spreadsheets().values().get().execute.return_value = {
+            "values": [["111", "user", "", "", "new", "0", "0", "", "", "", "+7000"]]
+        }
+
+        await client.upsert_lead(111, stage="engaged", notes="VIP")
+
+        mock_service.spreadsheets().values().update.assert_not_called()
+        data = mock_service.spreadsheets().values().batchUpdate.call_args.kwargs["body"]["data"]
+        assert [d["range"] for d in data] == ["Leads!D2:E2", "Leads!M2:M2"]
+        assert data[0]["values"][0][1] == "engaged"
+        assert data[1]["values"] == [["VIP"]]
+        lead = await client.get_lead(111)
+        assert lead["stage"] == "engaged"
+        assert lead["notes"] == "VIP"
+
+    @pytest.mark.asyncio
+    async def test_search_leads_matches_and_limits(self, mock_sheets_client):
+        """Test search matches user_id, phone digits and username, capped at 20."""
+        client, mock_service = mock_sheets_client
+
+        rows = [["111", "alice", "", "", "new", "", "", "", "", "", "+7 (900) 555-12-34"]]
+        rows += [[str(1000 + i), f"bulk{i}"] for i in range(30)]
+        mock_service.spreadsheets().values().get().execute.return_value = {"values": rows}
+
+        by_phone = await client.search_leads("555-12")
+        assert [lead["user_id"] for lead in by_phone] == ["111"]
+        assert by_phone[0]["notes"] == ""
+
+        by_name = await client.search_leads("ALICE")
+        assert [lead["user_id"] for lead in by_name] == ["111"]
+
+        assert len(await client.search_leads("bulk")) == 20
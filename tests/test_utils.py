@@ -94,8 +94,8 @@ class TestEscapeHtml:
     def test_escape_quotes(self):
         from app.utils import escape_html
 
-        # html.escape escapes quotes by default
-        assert "&quot;" in escape_html('"quote"') or '"' in escape_html('"quote"')
+        # Quotes are left as-is: Telegram only needs < > & escaped in text
+        assert escape_html('"quote" it\'s') == '"quote" it\'s'
 
     def test_no_escape_needed(self):
         from app.utils import escape_html